@@ -0,0 +1,231 @@
+"""Time yd commands on synthetic stores.
+
+For each store size, documents are generated in a temporary home
+directory, so ``~/.yew.d`` is never touched, and these are timed, each
+run in a fresh process as a user would:
+
+- cold start: ``yd ls --help``, which imports yd and opens the store
+- ``ls``, ``ls -l``, ``find``, ``tags``, ``generate-index --write`` and
+  ``verify``
+- ``sync`` with nothing to do, against a remote in a local directory,
+  see local_remote.py
+
+Results are written as JSON so runs on different commits can be
+compared. From the repository root:
+
+    python benchmarks/commands.py --docs 1000 --docs 10000 -o before.json
+    git checkout my-branch
+    python benchmarks/commands.py --docs 1000 --docs 10000 -o after.json \\
+        --compare before.json
+
+"""
+import datetime
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+import click
+from strgen import StringGenerator
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+USERNAME = "bench"
+
+# a word planted in some documents for find to look for
+NEEDLE = "benchneedle"
+
+TAGS = ["work", "home", "blog", "draft", "archived"]
+
+COMMANDS = {
+    "cold start": ["ls", "--help"],
+    "ls": ["ls"],
+    "ls -l": ["ls", "-l"],
+    "find": ["find", NEEDLE],
+    "tags": ["tags"],
+    "generate-index": ["generate-index", "--write"],
+    "verify": ["verify"],
+    "sync": ["sync"],
+}
+
+
+def make_store(home, count, seed=0):
+    """Write count documents for USERNAME under home and index them."""
+    rnd = random.Random(seed)
+    words = StringGenerator("[a-z]{3:10}").render_list(2000, unique=True)
+    location = os.path.join(home, ".yew.d", USERNAME, "default")
+    os.makedirs(location)
+    for i in range(count):
+        uid = str(uuid.UUID(int=rnd.getrandbits(128)))
+        path = os.path.join(location, uid)
+        os.mkdir(path)
+        title = " ".join(rnd.sample(words, rnd.randint(1, 4)))
+        body = [rnd.choice(words) for _ in range(rnd.randint(20, 400))]
+        if i % 100 == 0:
+            body.append(NEEDLE)
+        with open(os.path.join(path, f"{title}.md"), "wt") as f:
+            f.write(" ".join(body))
+        tags = rnd.sample(TAGS, rnd.randint(0, 2))
+        if tags:
+            with open(os.path.join(path, "__tags.json"), "wt") as f:
+                json.dump(tags, f)
+    yd(home, ["generate-index", "--write"])
+
+
+def set_remote(home, remote_type):
+    """Set or clear the remote_type pref of the benchmark user."""
+    path = os.path.join(home, ".yew.d", USERNAME, "settings.json")
+    settings = dict()
+    if os.path.exists(path):
+        with open(path) as f:
+            settings = json.load(f)
+    location = settings.setdefault("location", dict()).setdefault("default", dict())
+    if remote_type:
+        location["remote_type"] = remote_type
+    else:
+        location.pop("remote_type", None)
+    with open(path, "wt") as f:
+        json.dump(settings, f)
+
+
+def yd(home, args, timeout=None, script="yd.py") -> float:
+    """Run yd in a new process and return the elapsed seconds."""
+    env = dict(os.environ, HOME=home, YD_BENCH_REMOTE=os.path.join(home, "remote"))
+    env.pop("YEWDOC_USER", None)
+    command = [sys.executable, script, f"--user={USERNAME}"] + args
+    start = time.perf_counter()
+    result = subprocess.run(
+        command,
+        cwd=ROOT,
+        env=env,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        timeout=timeout,
+    )
+    elapsed = time.perf_counter() - start
+    if result.returncode:
+        raise click.ClickException(
+            f"{' '.join(args)} failed: {result.stderr.decode(errors='replace')}"
+        )
+    return elapsed
+
+
+def time_command(home, name, repeat, timeout):
+    """Return timings of a command in seconds, or None if it timed out."""
+    script = "yd.py"
+    if name == "sync":
+        script = os.path.join("benchmarks", "local_remote.py")
+        set_remote(home, "RemoteLocal")
+        # the first sync pushes everything, we time the ones after
+        yd(home, COMMANDS[name], None, script)
+    try:
+        runs = [yd(home, COMMANDS[name], timeout, script) for _ in range(repeat)]
+    except subprocess.TimeoutExpired:
+        return None
+    finally:
+        set_remote(home, None)
+    return {
+        "min": min(runs),
+        "median": statistics.median(runs),
+        "runs": runs,
+    }
+
+
+def git_commit():
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+def print_results(results, previous=None):
+    """Print the best times, and the change from previous results."""
+    for docs, timings in results.items():
+        click.echo(f"{docs} documents")
+        for name, timing in timings.items():
+            line = f"  {name:16}"
+            line += (
+                "  timed out" if timing is None else f"{timing['min'] * 1000:9.0f}ms"
+            )
+            before = (previous or dict()).get(docs, dict()).get(name)
+            if timing and before:
+                change = (timing["min"] - before["min"]) / before["min"] * 100
+                line += f"  was {before['min'] * 1000:.0f}ms ({change:+.0f}%)"
+            click.echo(line)
+
+
+@click.command()
+@click.option(
+    "--docs",
+    "-n",
+    type=int,
+    multiple=True,
+    help="Store size; repeat for several, defaults to 1000 and 10000",
+)
+@click.option("--repeat", "-r", default=3, help="Runs per timing, best is reported")
+@click.option(
+    "--command",
+    "-c",
+    "names",
+    type=click.Choice(list(COMMANDS)),
+    multiple=True,
+    help="Only time these commands",
+)
+@click.option(
+    "--timeout", default=600, help="Give up on a command after this many seconds"
+)
+@click.option("--output", "-o", type=click.Path(), help="Write results to this file")
+@click.option(
+    "--compare", type=click.File(), help="Results of an earlier run to compare with"
+)
+def main(docs, repeat, names, timeout, output, compare):
+    previous = json.load(compare)["results"] if compare else None
+    results = dict()
+    for count in docs or (1000, 10000):
+        home = tempfile.mkdtemp(prefix="yd-bench-")
+        try:
+            start = time.perf_counter()
+            make_store(home, count)
+            click.echo(
+                f"made {count} documents in {time.perf_counter() - start:.1f}s",
+                err=True,
+            )
+            results[str(count)] = {
+                name: time_command(home, name, repeat, timeout)
+                for name in names or COMMANDS
+            }
+        finally:
+            shutil.rmtree(home)
+    print_results(results, previous)
+    if output:
+        with open(output, "wt") as f:
+            json.dump(
+                {
+                    "commit": git_commit(),
+                    "date": datetime.datetime.now().isoformat(),
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "repeat": repeat,
+                    "results": results,
+                },
+                f,
+                indent=4,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Compare the list of dicts index with the columnar index.
+
+Times, on synthetic records:
+
+- sorting all records by mtime, as ``yd ls`` does
+- finding zero size records, as ``yd purge`` does
+- a size and kind query, as ``yd ls -q`` does
+
+Run from the repository root:
+
+    python benchmarks/index_layout.py --docs 200000
+
+"""
+import os
+import random
+import sys
+import time
+import uuid
+
+import click
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from yewdoc import index  # noqa: E402
+from yewdoc.doc_query import MetadataQuery  # noqa: E402
+
+
+def make_records(count, seed=0):
+    rnd = random.Random(seed)
+    now = time.time()
+    kinds = ["md", "txt", "rst", "html"]
+    return [
+        {
+            "uid": str(uuid.UUID(int=rnd.getrandbits(128))),
+            "title": f"document {i}",
+            "kind": rnd.choice(kinds),
+            "digest": None,
+            "tags": rnd.sample(["work", "home", "blog", "draft"], rnd.randint(0, 2)),
+            "encrypt": 0,
+            "size": rnd.choice([0] + [rnd.randint(1, 100_000)] * 20),
+            "mtime": now - rnd.random() * 365 * 86400,
+            "link": False,
+        }
+        for i in range(count)
+    ]
+
+
+def best_of(repeat, f):
+    """Return fastest run time of f in milliseconds."""
+    times = list()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000
+
+
+@click.command()
+@click.option("--docs", "-n", default=100_000, help="Number of records")
+@click.option("--repeat", "-r", default=5, help="Runs per timing, best is shown")
+def main(docs, repeat):
+    records = make_records(docs)
+    query = MetadataQuery("kind:md size>10k")
+    zero = MetadataQuery("size=0")
+    layouts = {
+        "list of dicts": index.DocIndex(records),
+        "columnar": index.ColumnarIndex(records),
+    }
+    backend = "numpy" if index.load_numpy() is not None else "array module"
+    print(f"{docs} records, columnar index using {backend}")
+    start = time.perf_counter()
+    layouts["columnar"].columns()
+    print(f"building columns: {(time.perf_counter() - start) * 1000:.1f}ms")
+    print(f"{'':16}{'sort mtime':>12}{'size=0':>12}{'query':>12}")
+    for name, doc_index in layouts.items():
+        all_records = doc_index.to_list()
+        timings = [
+            best_of(repeat, lambda: doc_index.sort_records(all_records, "mtime", True)),
+            best_of(repeat, lambda: doc_index.match_query(zero)),
+            best_of(repeat, lambda: doc_index.match_query(query)),
+        ]
+        print(f"{name:16}" + "".join(f"{t:10.1f}ms" for t in timings))
+
+
+if __name__ == "__main__":
+    main()
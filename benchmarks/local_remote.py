@@ -0,0 +1,61 @@
+"""A remote that keeps documents in a local directory, for benchmarks.
+
+RemoteLocal is the S3 remote with the bucket swapped for a directory,
+given by the YD_BENCH_REMOTE environment variable, so ``yd sync`` can
+be timed without a network. Run yd through this script to make it
+available as remote_type RemoteLocal:
+
+    YD_BENCH_REMOTE=/tmp/remote python benchmarks/local_remote.py sync
+
+"""
+import os
+import sys
+
+from fsspec.implementations.local import LocalFileSystem
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from yewdoc import cli, utils  # noqa: E402
+from yewdoc.remote import REMOTES  # noqa: E402
+from yewdoc.remote.s3remote import RemoteS3  # noqa: E402
+
+
+class RemoteLocal(RemoteS3):
+    """RemoteS3 on a local directory instead of a bucket."""
+
+    def __init__(self, store):
+        self.store = store
+        self.store.digest_method = utils.get_md5_digest
+        self.bucket = os.environ["YD_BENCH_REMOTE"]
+        self.s3 = LocalFileSystem(auto_mkdir=True)
+
+    def check_data(self):
+        pass
+
+    def list_docs(self):
+        """Get list of remote documents, as S3 would describe them."""
+        data = list()
+        for root, _, files in os.walk(os.path.join(self.bucket, self.store.username)):
+            for fn in files:
+                if fn.startswith("__"):
+                    continue
+                path = os.path.join(root, fn)
+                base, ext = os.path.splitext(fn)
+                with open(path, encoding="utf-8") as f:
+                    digest = utils.get_md5_digest(f.read())
+                data.append(
+                    {
+                        "uid": os.path.basename(root),
+                        "title": base,
+                        "kind": ext[1:],
+                        "digest": digest,
+                        "date_updated": utils.modification_date(path),
+                        "tags": list(),
+                    }
+                )
+        return data
+
+
+if __name__ == "__main__":
+    REMOTES.loaded["RemoteLocal"] = RemoteLocal
+    cli()
@@ -16,7 +16,7 @@ setup(
     install_requires=install_requires,
     entry_points = {
         "console_scripts": [
-            "yd = yd:cli",
+            "yd = yd:main",
         ]
     }
 )
@@ -1,4 +1,17 @@
-from yewdoc import cli
+import sys
+
+from yewdoc.daemon import run_in_daemon
+
+
+def main():
+    # let a running yd daemon answer if it can
+    exit_code = run_in_daemon(sys.argv[1:])
+    if exit_code is not None:
+        sys.exit(exit_code)
+    from yewdoc import cli
 
-if __name__ == "__main__":
     cli()
+
+
+if __name__ == "__main__":
+    main()
@@ -15,46 +15,16 @@ __version__ = "0.2.0"
 __author__ = "Paul Wolf"
 __license__ = "BSD"
 
-from .shared import cli
-from .cmd import (
-    apply,
-    cp,
-    generate_index,
-    path,
-    purge,
-    attach,
-    status,
-    ls,
-    ping,
-    info,
-    sync,
-    edit,
-    register,
-    user_pref,
-    read,
-    take,
-    configure,
-    authenticate,
-    create,
-    tag,
-    tags,
-    convert,
-    browse,
-    context,
-    encrypt,
-    decrypt,
-    api,
-    kind,
-    find,
-    rename,
-    head,
-    tail,
-    push,
-    archive,
-    delete,
-    show,
-    describe,
-    verify,
-    diff,
-    rls,
-)
+# first, so yd --profile can time importing the rest
+from . import profiling
+
+
+def __getattr__(name):
+    # imported when asked for, so yd can talk to a running daemon
+    # without loading the rest; commands are imported when used, see
+    # shared.LazyGroup
+    if name == "cli":
+        from .shared import cli
+
+        return cli
+    raise AttributeError(f"module {__name__} has no attribute {name}")
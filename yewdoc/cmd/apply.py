@@ -9,7 +9,9 @@ from .. import shared
 @click.argument("action_name", required=False)
 @click.argument("name", required=False)
 @click.option("--exact", "-e", is_flag=True, required=False)
-@click.option("--tags", "-t", required=False)
+@click.option(
+    "--tags", "-t", required=False, callback=shared.parse_tags, help=shared.TAGS_HELP
+)
 @click.pass_context
 def apply(ctx, action_name, name, exact, tags):
     """Apply an action to a document search.
@@ -21,11 +23,11 @@ def apply(ctx, action_name, name, exact, tags):
     """
     yew = ctx.obj["YEW"]
 
-    tags = tags.split(",") if tags else list()
     docs = yew.store.get_docs(name_frag=name, tags=tags, exact=exact)
     if not docs:
         return
     if action_name not in yew.actions:
         print(f"Can't find that action: {action_name}")
-    for doc in docs:
-        yew.actions[action_name](doc, yew.store, yew.remote)
+    with yew.store.batch():
+        for doc in docs:
+            yew.actions[action_name](doc, yew.store, yew.remote)
@@ -17,7 +17,9 @@ except Exception:
 @click.argument("name", required=False)
 @click.argument("template", required=False)
 @click.option("--list_docs", "-l", is_flag=True, required=False)
-@click.option("--tags", "-t", required=False)
+@click.option(
+    "--tags", "-t", required=False, callback=shared.parse_tags, help=shared.TAGS_HELP
+)
 @click.pass_context
 def browse(ctx, name, template, list_docs, tags):
     """Convert to html and attempt to load in web browser.
@@ -42,7 +44,6 @@ def browse(ctx, name, template, list_docs, tags):
 
     input_formats = ["md", "rst"]
 
-    tags = tags.split(",") if tags else list()
     docs = yew.store.get_docs(name_frag=name, tags=tags)
 
     nav = ""
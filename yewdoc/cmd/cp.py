@@ -11,7 +11,9 @@ from .. import shared
 @shared.cli.command()
 @click.argument("name", required=False)
 @click.argument("destination", required=False)
-@click.option("--tags", "-t", required=False)
+@click.option(
+    "--tags", "-t", required=False, callback=shared.parse_tags, help=shared.TAGS_HELP
+)
 @click.option("--list_docs", "-l", is_flag=True, required=False)
 @click.option("--force", "-f", is_flag=True, required=False)
 @click.option("--preserve", "-p", is_flag=True, required=False)
@@ -30,7 +32,6 @@ def cp(ctx, name, destination, tags, list_docs=False, force=False, preserve=Fals
     if not os.path.isdir(destination):
         print("Destination must be a directory")
 
-    tags = tags.split(",") if tags else list()
     docs = shared.get_document_selection(ctx, name, list_docs, tags, multiple=True)
 
     if not force:
@@ -28,3 +28,5 @@ def create(ctx, name, kind):
 
     click.echo(f"created document: {doc.uid}, {doc.name}.{doc.kind}")
     click.edit(require_save=True, filename=doc.path)
+    yew.store.reindex_doc(doc)
+    yew.store.update_recent(doc)
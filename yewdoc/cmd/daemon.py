@@ -0,0 +1,52 @@
+import os
+import sys
+
+import click
+
+from .. import shared
+from .. import daemon as yd_daemon
+
+
+@shared.cli.command()
+@click.option("--stop", is_flag=True, required=False, help="Stop the running daemon")
+@click.option(
+    "--preload",
+    is_flag=True,
+    required=False,
+    help="Load and refresh the search indexes before serving",
+)
+@click.pass_context
+def daemon(ctx, stop, preload):
+    """Keep the store in memory and serve commands from it.
+
+    While the daemon runs, ls, find, show and other commands that only
+    read are answered by it over a Unix socket in the user directory,
+    which saves loading yd and the index each time. Other commands,
+    and those that need to ask you something, run as usual.
+
+    The daemon runs until stopped with --stop or Ctrl-C; start it in
+    the background with: yd daemon &
+
+    """
+    yew = ctx.obj["YEW"]
+    path = yd_daemon.socket_path(yew.store.username)
+    try:
+        pid = yd_daemon.request(path, {"ping": True}, 1)["pid"]
+    except OSError:
+        pid = None
+    if stop:
+        if pid is None:
+            click.echo("daemon is not running")
+            sys.exit(1)
+        yd_daemon.request(path, {"stop": True})
+        click.echo(f"stopped daemon {pid}")
+        return
+    if pid is not None:
+        click.echo(f"daemon {pid} is already running on {path}")
+        sys.exit(1)
+    if os.path.exists(path):
+        # left by a daemon that didn't exit cleanly
+        os.unlink(path)
+    server = yd_daemon.Daemon(yew, preload=preload)
+    click.echo(f"serving {yew.store.username} on {path}")
+    server.serve(path)
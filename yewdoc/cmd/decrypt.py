@@ -29,7 +29,7 @@ def decrypt(ctx, name, list_docs, gpghome):
     email = yew.store.prefs.get_user_pref("location.default.email")
 
     # try to decrypt in place
-    for doc in docs:
-        crypt.decrypt_file(doc.get_path(), email, gpghome)
-        # yew.store.prefs.put_user_pref("current_doc", doc.uid)
-        # yew.store.update_recent("yewser", doc)
+    with yew.store.batch():
+        for doc in docs:
+            crypt.decrypt_file(doc.get_path(), email, gpghome)
+            doc.toggle_encrypted()
@@ -28,5 +28,6 @@ def delete(ctx, name, list_docs, force):
     if not force:
         d = click.confirm("Do you want to continue to delete the document(s)?")
     if d:
-        for doc in docs:
-            yew.store.delete_document(doc)
+        with yew.store.batch():
+            for doc in docs:
+                yew.store.delete_document(doc)
@@ -47,7 +47,7 @@ def edit(ctx, name, list_docs, open_file, gpghome):
     # if doc is null, we didn't find one, ask if we should create:
     if not docs:
         if click.confirm("Couldn't find that document, shall we create it?"):
-            doc = yew.store.create_document(name, kind="md")
+            docs = [yew.store.create_document(name, kind="md")]
         else:
             sys.exit(0)
 
@@ -64,6 +64,5 @@ def edit(ctx, name, list_docs, open_file, gpghome):
 
     if encrypted:
         crypt.encrypt_file(doc.get_path(), email, gpghome)
-
-    # yew.store.prefs.put_user_pref("current_doc", doc.uid)
-    # yew.store.prefs.update_recent(doc)
+    yew.store.reindex_doc(doc)
+    yew.store.update_recent(doc)
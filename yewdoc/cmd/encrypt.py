@@ -31,6 +31,7 @@ def encrypt(ctx, name, list_docs, gpghome):
 
     # try to encrypt in place
     crypt.encrypt_file(doc.get_path(), email, gpghome)
+    doc.toggle_encrypted()
 
     yew.store.prefs.put_user_pref("current_doc", doc.uid)
-    yew.store.update_recent("yewser", doc)
+    yew.store.update_recent(doc)
@@ -10,29 +10,95 @@ from .. import shared
 @click.argument("spec", required=True)
 @click.option("--string-only", "-s", is_flag=True, required=False)
 @click.option("--insensitive", "-i", is_flag=True, required=False)
+@click.option(
+    "--jobs",
+    "-j",
+    type=int,
+    default=1,
+    help="Number of processes scanning documents; matches are listed as found",
+)
+@click.option(
+    "--line-numbers", "-n", is_flag=True, help="Show matching lines with numbers"
+)
+@click.option(
+    "--context",
+    "-C",
+    type=click.IntRange(0),
+    default=0,
+    help="Show N lines around matching lines",
+)
+@click.option(
+    "--max-count",
+    "-m",
+    type=click.IntRange(0),
+    help="Stop reading a document after N matching lines",
+)
+@click.option(
+    "--files-with-matches",
+    "-l",
+    is_flag=True,
+    help="Only show names of matching documents (default without -n, -C or -m)",
+)
+@click.option(
+    "--limit", type=click.IntRange(1), help="Stop after N matching documents"
+)
 @click.pass_context
-def find(ctx, spec, string_only, insensitive):
+def find(
+    ctx,
+    spec,
+    string_only,
+    insensitive,
+    jobs,
+    line_numbers,
+    context,
+    max_count,
+    files_with_matches,
+    limit,
+):
     """Search for spec in contents of docs.
 
     spec is a regular expression unless string-only is selected
     in which case a simple string match is used.
 
+    Plain strings are looked up in a word index and regular
+    expressions in an index of three character sequences, so only
+    documents that might match are read. Files are searched as
+    memory mapped bytes unless the spec needs the decoded text,
+    for instance to ignore case.
+
+    With --line-numbers, --context or --max-count, matching lines are
+    shown like grep does, matching each line on its own.
+
     """
     yew = ctx.obj["YEW"]
 
-    docs = yew.store.get_docs()
-
-    for doc in docs:
-        found = False
-        if string_only:
-            if not insensitive:
-                if spec in doc.get_content():
-                    found = True
-            else:
-                if spec.lower() in doc.get_content().lower():
-                    found = True
-        elif re.search(spec, doc.get_content()):
-            found = True
+    if max_count == 0:
+        # like grep, no lines are wanted so there is nothing to read
+        return
 
-        if found:
+    if files_with_matches or not (line_numbers or context or max_count):
+        docs = yew.store.find_docs(spec, string_only, insensitive, jobs)
+        for i, doc in enumerate(docs, 1):
             click.echo(doc.name)
+            if limit and i >= limit:
+                break
+        return
+
+    found = yew.store.find_lines(
+        spec, string_only, insensitive, context, max_count, jobs
+    )
+    for i, (doc, lines) in enumerate(found, 1):
+        if context and i > 1:
+            click.echo("--")
+        previous = None
+        for number, line, matched in lines:
+            if context and previous is not None and number > previous + 1:
+                click.echo("--")
+            previous = number
+            sep = ":" if matched else "-"
+            if line_numbers:
+                click.echo(f"{doc.name}{sep}{number}{sep}{line}")
+            else:
+                click.echo(f"{doc.name}{sep}{line}")
+        if limit and i >= limit:
+            break
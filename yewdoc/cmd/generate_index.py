@@ -1,5 +1,6 @@
 import sys
 import json
+import time
 
 import click
 
@@ -8,14 +9,49 @@ from .. import shared
 
 @shared.cli.command()
 @click.option("--write", "-w", is_flag=True, required=False)
+@click.option(
+    "--compact",
+    "-c",
+    is_flag=True,
+    required=False,
+    help="Fold the index journal into index.json without rescanning",
+)
+@click.option(
+    "--incremental",
+    "-i",
+    is_flag=True,
+    required=False,
+    help="Only read documents changed since they were indexed and update the index",
+)
+@click.option(
+    "--jobs",
+    "-j",
+    type=int,
+    required=False,
+    help="Number of processes reading documents, defaults to one per cpu",
+)
 @click.pass_context
-def generate_index(ctx, write):
+def generate_index(ctx, write, compact, incremental, jobs):
     """Iterate document directory and output index json to stdout.
     This can be used to replace a damaged or missing index.
     """
     yew = ctx.obj["YEW"]
-    data = yew.store.generate_doc_data(write=write)
+    if compact:
+        yew.store.compact_index()
+        print(f"compacted index: {yew.store.index_path}")
+        return
+    if incremental:
+        counts = yew.store.update_doc_data(jobs=jobs)
+        print(", ".join(f"{k}: {v}" for k, v in counts.items()))
+        return
+    start = time.perf_counter()
+    data = yew.store.generate_doc_data(write=write, jobs=jobs)
+    elapsed = time.perf_counter() - start
+    rate = len(data) / elapsed if elapsed else 0
+    click.echo(
+        f"indexed {len(data)} docs in {elapsed:.2f}s ({rate:.0f} docs/s)", err=True
+    )
     if write:
-        print(f"recreated index: {yew.store.yew_dir}/index.json")
+        print(f"recreated index: {yew.store.index_path}")
     else:
         print(json.dumps(data, indent=4))
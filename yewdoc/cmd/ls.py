@@ -3,6 +3,7 @@ import os
 import humanize as h
 import click
 from .. import shared
+from ..utils import utc_from_timestamp
 
 
 @shared.cli.command()
@@ -10,28 +11,60 @@ from .. import shared
 @click.option("--info", "-l", required=False, count=True)
 @click.option("--humanize", "-h", is_flag=True, required=False)
 @click.option("--exact", "-e", is_flag=True, required=False)
-@click.option("--tags", "-t", required=False)
+@click.option(
+    "--tags", "-t", required=False, callback=shared.parse_tags, help=shared.TAGS_HELP
+)
 @click.option("--sort", "-s", is_flag=True, required=False)
 @click.option("--size", "-S", is_flag=True, required=False)
 @click.option("--descending", "-d", is_flag=True, required=False)
+@click.option(
+    "--verify",
+    "-v",
+    is_flag=True,
+    required=False,
+    help="Check size and modification time on disk rather than trusting the index",
+)
+@click.option(
+    "--query",
+    "-q",
+    required=False,
+    callback=shared.parse_query,
+    help="Metadata to match, like 'kind:md size>10k updated<30d encrypted:no'",
+)
 @click.pass_context
-def ls(ctx, name, info, humanize, exact, tags, sort, size, descending):
-    """List documents."""
+def ls(ctx, name, info, humanize, exact, tags, sort, size, descending, verify, query):
+    """List documents.
+
+    Besides matching the title with NAME, documents can be selected by
+    --query on kind, size, updated (an age like 30d or a date),
+    encrypted, link, tag and title, all of which must match. This only
+    reads the index; use --verify if documents were changed elsewhere.
+
+    """
     yew = ctx.obj["YEW"]
 
-    tags = tags.split(",") if tags else list()
-    docs = yew.store.get_docs(name_frag=name, tags=tags, exact=exact)
-    if not docs:
-        return
+    if verify:
+        docs = yew.store.get_docs(name_frag=name, tags=tags, exact=exact)
+        yew.store.refresh_stat_data(docs)
     if sort or size or descending:
-        if size:
-            docs.sort(key=lambda doc: doc.size, reverse=descending)
+        order_by = "size" if size else None
     else:
-        docs.sort(key=lambda doc: doc.updated, reverse=descending)
+        order_by = "updated"
+    docs = yew.store.get_docs(
+        name_frag=name,
+        tags=tags,
+        exact=exact,
+        order_by=order_by,
+        descending=descending,
+        query=query,
+    )
+    if not docs:
+        return
 
     for doc in docs:
         if info:
-            if doc.is_link():
+            stat_data = yew.store.get_stat_data(doc)
+            if stat_data["link"]:
                 click.echo("ln ", nl=False)
             else:
                 click.echo("   ", nl=False)
@@ -39,27 +72,24 @@ def ls(ctx, name, info, humanize, exact, tags, sort, size, descending):
             click.echo("   ", nl=False)
             click.echo(doc.kind.rjust(5), nl=False)
             click.echo("   ", nl=False)
-            if not os.path.exists(doc.path):
+            if stat_data["size"] is None:
                 click.echo("File does not exist")
                 continue
 
             if humanize:
-                click.echo(h.naturalsize(doc.get_size()).rjust(10), nl=False)
+                click.echo(h.naturalsize(stat_data["size"]).rjust(10), nl=False)
             else:
-                click.echo(str(doc.get_size()).rjust(10), nl=False)
+                click.echo(str(stat_data["size"]).rjust(10), nl=False)
             click.echo("   ", nl=False)
+            updated = utc_from_timestamp(stat_data["mtime"])
             if humanize:
                 click.echo(
-                    h.naturaltime(
-                        doc.get_last_updated_utc().replace(tzinfo=None)
-                    ).rjust(15),
+                    h.naturaltime(updated.replace(tzinfo=None)).rjust(15),
                     nl=False,
                 )
             else:
                 click.echo(
-                    doc.get_last_updated_utc()
-                    .replace(microsecond=0)
-                    .replace(tzinfo=None),
+                    updated.replace(microsecond=0).replace(tzinfo=None),
                     nl=False,
                 )
             if doc.is_encrypted():
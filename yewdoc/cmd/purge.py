@@ -14,16 +14,18 @@ def purge(ctx, name, list_docs, force):
 
     provide a name fragment to filter.
 
+    Sizes are as recorded in the index; run `yd ls --verify` first if
+    documents were changed elsewhere.
+
     """
     yew = ctx.obj["YEW"]
-    docs = yew.store.get_docs(name_frag=name)
-
-    docs = list(filter(lambda d: d.size == 0, docs))
+    docs = yew.store.get_docs(name_frag=name, query="size=0")
     for doc in docs:
         click.echo(f"{doc.uid}, {doc.name}")
     d = True
     if not force:
         d = click.confirm("Do you want to continue to delete the document(s)?")
     if d:
-        for doc in docs:
-            yew.store.delete_document(doc)
+        with yew.store.batch():
+            for doc in docs:
+                yew.store.delete_document(doc)
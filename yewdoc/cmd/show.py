@@ -11,11 +11,12 @@ from .. import shared
 @click.pass_context
 def show(ctx, name, list_docs):
     """Send contents of document to stdout."""
-    # yew = ctx.obj["YEW"]
+    yew = ctx.obj["YEW"]
 
     docs = shared.get_document_selection(ctx, name, list_docs)
     if docs:
         click.echo(docs[0].get_content())
+        yew.store.update_recent(docs[0])
     else:
         click.echo("no matching documents")
     sys.stdout.flush()
@@ -50,4 +50,5 @@ def sync(ctx, name, force, prune, verbose, fake, tags, list_docs):
 
     """
     yew = ctx.obj["YEW"]
-    yew.remote.sync(name, force, prune, verbose, fake, tags, list_docs, ctx)
+    with yew.store.batch():
+        yew.remote.sync(name, force, prune, verbose, fake, tags, list_docs, ctx)
@@ -1,5 +1,4 @@
 import sys
-from collections import defaultdict
 
 import click
 
@@ -7,15 +6,8 @@ from .. import shared
 
 
 def print_tags(store, tagname):
-    stats = defaultdict(int)
-    tagged_count = 0
-    for data in store.index:
-        doc_tags = data.get("tags", list())
-        if doc_tags:
-            tagged_count += 1
-        for t in doc_tags:
-            stats[t] += 1
-    print(f"Total tagged docs: {tagged_count}")
+    stats = store.get_tag_counts()
+    print(f"Total tagged docs: {store.get_tagged_count()}")
     for k, v in stats.items():
         if tagname and k != tagname:
             continue
@@ -49,10 +41,10 @@ def tag(ctx, tagname, docname, list_docs, untag):
         print_tags(yew.store, tagname)
         return
     docs = shared.get_document_selection(ctx, docname, list_docs, multiple=True)
-    for doc in docs:
-        if not untag:
-            doc.add_tag(tagname)
-        else:
-            doc.remove_tag(tagname)
-        yew.store.reindex_doc(doc, write_index_flag=False)
-    yew.store.write_index()
+    with yew.store.batch():
+        for doc in docs:
+            if not untag:
+                doc.add_tag(tagname)
+            else:
+                doc.remove_tag(tagname)
+            yew.store.reindex_doc(doc)
@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+"""
+Serve yd commands from a long running process.
+
+``yd daemon`` opens the store once and listens on daemon.sock in the
+user directory. While it runs, yd sends the commands in
+DAEMON_COMMANDS to it and prints what comes back, rather than
+importing yewdoc and reading the index itself. The daemon reopens the
+store if the index or settings were changed by another process.
+
+A request is a line of JSON, {"args": [...], "color": bool}, answered
+with {"exit_code": n, "output": "...", "stderr": "..."}, or with
+{"interactive": true} if the command wanted to read from the terminal,
+in which case yd runs it itself.
+
+This module is imported by every yd invocation, so the client side
+only uses the standard library.
+
+"""
+import io
+import json
+import os
+import socket
+import sys
+from typing import Dict, List, Optional, Tuple
+
+from . import file_system as fs
+
+SOCKET_NAME = "daemon.sock"
+
+# commands that only read and never start an editor, so the daemon can
+# run them; if one prompts after all, the client runs it instead
+DAEMON_COMMANDS = [
+    "describe",
+    "find",
+    "head",
+    "ls",
+    "path",
+    "show",
+    "status",
+    "tags",
+    "tail",
+]
+
+# files whose change by another process means our store is stale
+WATCHED_FILES = [
+    "index.json",
+    "index.journal",
+    "index.sqlite3",
+    "settings.json",
+    "recent.json",
+]
+
+
+class NeedsTerminal(Exception):
+    """Raised when a command run by the daemon reads from stdin."""
+
+
+class TerminalTrap(io.BytesIO):
+    """Stdin for commands run by the daemon; reading it raises NeedsTerminal."""
+
+    def read(self, size=-1):
+        if size == 0:
+            return b""
+        raise NeedsTerminal()
+
+    read1 = read
+
+    def readline(self, size=-1):
+        raise NeedsTerminal()
+
+
+def socket_path(username=None) -> str:
+    return os.path.join(fs.get_user_directory(username), SOCKET_NAME)
+
+
+def parse_global_options(argv: List[str]) -> Tuple[Optional[str], List[str], bool]:
+    """Return the --user value, the rest of argv and whether it can be forwarded.
+
+    Only --user can be forwarded; --debug and --profile are about this
+    process.
+
+    """
+    user = None
+    args = list(argv)
+    while args and args[0].startswith("-"):
+        option = args.pop(0)
+        if option.startswith("--user="):
+            user = option[len("--user=") :]
+        elif option == "--user" and args:
+            user = args.pop(0)
+        else:
+            return user, args, False
+    return user, args, True
+
+
+def request(path: str, message: Dict, timeout: Optional[float] = None) -> Dict:
+    """Send message to the daemon at path and return its reply."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(path)
+        sock.settimeout(None)
+        with sock.makefile("rwb") as f:
+            f.write(json.dumps(message).encode("utf-8") + b"\n")
+            f.flush()
+            line = f.readline()
+    if not line:
+        raise ConnectionError("daemon closed the connection")
+    return json.loads(line)
+
+
+def run_in_daemon(argv: List[str]) -> Optional[int]:
+    """Run a yd command line in the daemon if we can.
+
+    Return the exit code, or None if it should be run in this process.
+
+    """
+    user, args, forward = parse_global_options(argv)
+    if not forward or not args or args[0] not in DAEMON_COMMANDS:
+        return None
+    if "--help" in args:
+        return None
+    path = socket_path(fs.get_username(user))
+    if not os.path.exists(path):
+        return None
+    try:
+        reply = request(path, {"args": argv, "color": sys.stdout.isatty()}, 1)
+    except OSError:
+        # not running, or died without removing the socket
+        return None
+    if reply.get("interactive"):
+        return None
+    sys.stdout.write(reply["output"])
+    sys.stdout.flush()
+    sys.stderr.write(reply["stderr"])
+    return reply["exit_code"]
+
+
+def file_signature(directory: str) -> List:
+    signature = list()
+    for name in WATCHED_FILES:
+        try:
+            stat = os.stat(os.path.join(directory, name))
+            signature.append((name, stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            signature.append((name, None, None))
+    return signature
+
+
+class Daemon(object):
+    """Runs commands against a YewCLI kept between requests."""
+
+    def __init__(self, yew, preload=False):
+        self.yew = yew
+        self.username = yew.store.username
+        self.preload = preload
+        self.signature = None
+        self.stopping = False
+        self.warm_up()
+
+    def warm_up(self) -> None:
+        if self.preload:
+            for search_index in self.yew.store.search_indexes:
+                self.yew.store.refresh_search_index(search_index)
+            self.yew.store.flush()
+        self.signature = file_signature(self.yew.store.yew_dir)
+
+    def refresh(self) -> None:
+        """Reopen the store if another process changed it."""
+        from .shared import YewCLI
+
+        if file_signature(self.yew.store.yew_dir) != self.signature:
+            self.yew = YewCLI(username=self.username)
+            self.warm_up()
+
+    def handle(self, message: Dict) -> Dict:
+        import traceback
+        from click.testing import CliRunner
+        from .shared import cli
+
+        if message.get("stop"):
+            self.stopping = True
+            return {"stopped": True}
+        if message.get("ping"):
+            return {"pid": os.getpid()}
+        user, args, forward = parse_global_options(message["args"])
+        if not forward or not args or args[0] not in DAEMON_COMMANDS:
+            return {"interactive": True}
+        if fs.get_username(user) != self.username:
+            return {"interactive": True}
+        self.refresh()
+        try:
+            runner = CliRunner(mix_stderr=False)
+        except TypeError:
+            # click 8.2 always keeps stderr apart
+            runner = CliRunner()
+        result = runner.invoke(
+            cli,
+            message["args"],
+            input=TerminalTrap(),
+            obj={"YEW": self.yew},
+            color=message.get("color", False),
+        )
+        # our own writes don't make the store stale
+        self.signature = file_signature(self.yew.store.yew_dir)
+        if isinstance(result.exception, NeedsTerminal):
+            return {"interactive": True}
+        stderr = result.stderr
+        if result.exception and not isinstance(result.exception, SystemExit):
+            # what yd would have printed had it run the command itself
+            stderr += "".join(traceback.format_exception(*result.exc_info))
+        return {
+            "exit_code": result.exit_code,
+            "output": result.stdout,
+            "stderr": stderr,
+        }
+
+    def serve(self, path: str) -> None:
+        """Answer requests on a Unix socket at path until asked to stop."""
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            server.bind(path)
+            server.listen()
+            while not self.stopping:
+                conn, _ = server.accept()
+                with conn, conn.makefile("rwb") as f:
+                    line = f.readline()
+                    if not line:
+                        continue
+                    try:
+                        reply = self.handle(json.loads(line))
+                    except Exception as e:
+                        reply = {"exit_code": 1, "output": "", "stderr": f"{e}\n"}
+                    f.write(json.dumps(reply).encode("utf-8") + b"\n")
+                    f.flush()
+        finally:
+            server.close()
+            if os.path.exists(path):
+                os.unlink(path)
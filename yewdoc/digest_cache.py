@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+Cache of document digests.
+
+Computing a digest means reading the whole document. We remember the
+digest together with the file's stat signature, (inode, size,
+mtime_ns), and only read the file again when the signature changes.
+
+The cache is kept in digests.json next to the index and is only read
+when a digest is first needed.
+
+"""
+import os
+from typing import Callable, Dict, List, Optional
+
+from .utils import read_json, write_json_atomic
+
+
+def stat_signature(stat: os.stat_result) -> List[int]:
+    return [stat.st_ino, stat.st_size, stat.st_mtime_ns]
+
+
+class DigestCache(object):
+    """Digests keyed on uid and digest method, valid for a stat signature."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.dirty = False
+        self._entries: Optional[Dict] = None
+
+    @property
+    def entries(self) -> Dict:
+        if self._entries is None:
+            self._entries = read_json(
+                self.path, dict(), "Ignoring damaged digest cache"
+            )
+        return self._entries
+
+    def get(self, uid: str, path: str, method: Callable, content: Callable) -> str:
+        """Return digest of the file at path.
+
+        content is called to get the document text only when we
+        don't have a digest for the current stat signature.
+
+        """
+        signature = stat_signature(os.stat(path))
+        entry = self.entries.get(uid)
+        if not entry or entry["signature"] != signature:
+            entry = {"signature": signature, "digests": dict()}
+            self.entries[uid] = entry
+        digest = entry["digests"].get(method.__name__)
+        if digest is None:
+            digest = method(content())
+            entry["digests"][method.__name__] = digest
+            self.dirty = True
+        return digest
+
+    def put(self, uid: str, signature: List[int], method: Callable, digest: str):
+        """Remember a digest computed elsewhere for a stat signature."""
+        self.entries[uid] = {
+            "signature": signature,
+            "digests": {method.__name__: digest},
+        }
+        self.dirty = True
+
+    def remove(self, uid: str) -> None:
+        if self.entries.pop(uid, None) is not None:
+            self.dirty = True
+
+    def save(self) -> None:
+        """Write the cache if anything changed."""
+        if not self.dirty:
+            return
+        write_json_atomic(self.path, self._entries)
+        self.dirty = False
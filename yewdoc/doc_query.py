@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""
+Queries on document metadata.
+
+A query is a list of terms separated by spaces, all of which must
+match:
+
+    kind:md,rst        kind is one of these
+    size>10k           size compared with a number of bytes; k, m and g
+                       suffixes are powers of 1024
+    updated<30d        modified less than 30 days ago; units are s, h,
+                       d and w
+    updated>2024-01-31 modified after the given day; = for on that day
+    encrypted:yes      or no
+    link:no            whether the document is a symlink
+    tag:'a & !b'       a tag query, see tag_query
+    title:regex        title matches, ignoring case
+
+Terms are compiled once into conditions on index record fields, so
+evaluating a query never touches the filesystem. Records that have no
+size or modification time never match conditions on them.
+
+"""
+import datetime
+import re
+import shlex
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from . import tag_query
+from .index import match
+
+TERM_RE = re.compile(r"^(\w+)(:|<=|>=|<|>|=)(.*)$")
+SIZE_RE = re.compile(r"^(\d+(?:\.\d+)?)([kmg]?)b?$", re.IGNORECASE)
+AGE_RE = re.compile(r"^(\d+(?:\.\d+)?)([shdw])$", re.IGNORECASE)
+
+SIZE_UNITS = {"": 1, "k": 1024, "m": 1024 ** 2, "g": 1024 ** 3}
+AGE_UNITS = {"s": 1, "h": 3600, "d": 86400, "w": 7 * 86400}
+BOOLEANS = {
+    "yes": True,
+    "true": True,
+    "1": True,
+    "no": False,
+    "false": False,
+    "0": False,
+}
+
+# comparisons that flip when we compare ages rather than times
+FLIPPED = {"<": ">", "<=": ">=", ">": "<", ">=": "<="}
+
+COMPARE = {
+    "=": lambda a, b: a == b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+}
+
+
+class QueryError(ValueError):
+    pass
+
+
+class MetadataQuery(object):
+    """A compiled metadata query.
+
+    conditions is a list of (field, op, value) on index records. The
+    tag terms are kept apart as one tag query in tags, so the index
+    can answer them from its tag postings.
+
+    """
+
+    def __init__(self, text: str, now: Optional[float] = None):
+        self.text = text
+        self.now = time.time() if now is None else now
+        self.conditions: List[Tuple[str, str, Any]] = list()
+        self.tags: Optional[Tuple] = None
+        try:
+            terms = shlex.split(text)
+        except ValueError as e:
+            raise QueryError(f"Can't parse query: {e}")
+        for term in terms:
+            self.add_term(term)
+
+    def add_term(self, term: str) -> None:
+        m = TERM_RE.match(term)
+        if not m:
+            raise QueryError(f"Can't parse query term: {term}")
+        name, op, value = m.groups()
+        name = name.lower()
+        handler = getattr(self, f"term_{name}", None)
+        if handler is None:
+            raise QueryError(f"Unknown field in query term: {term}")
+        handler(term, op, value)
+
+    def term_kind(self, term, op, value):
+        if op != ":":
+            raise QueryError(f"Use kind:<kind>[,<kind>...]: {term}")
+        self.conditions.append(("kind", "in", value.split(",")))
+
+    def term_size(self, term, op, value):
+        m = SIZE_RE.match(value)
+        if op == ":" or not m:
+            raise QueryError(f"Use size with <, <=, >, >= or = and bytes: {term}")
+        size = float(m.group(1)) * SIZE_UNITS[m.group(2).lower()]
+        self.conditions.append(("size", op, size))
+
+    def term_updated(self, term, op, value):
+        if op == ":":
+            op = "="
+        m = AGE_RE.match(value)
+        if m:
+            if op == "=":
+                raise QueryError(f"Compare ages with <, <=, > or >=: {term}")
+            age = float(m.group(1)) * AGE_UNITS[m.group(2).lower()]
+            self.conditions.append(("mtime", FLIPPED[op], self.now - age))
+            return
+        try:
+            day = datetime.date.fromisoformat(value)
+        except ValueError:
+            raise QueryError(f"Use an age like 30d or a date like 2024-01-31: {term}")
+        start = time.mktime(day.timetuple())
+        end = time.mktime((day + datetime.timedelta(days=1)).timetuple())
+        if op == "=":
+            self.conditions.append(("mtime", ">=", start))
+            self.conditions.append(("mtime", "<", end))
+        elif op in ("<", ">="):
+            self.conditions.append(("mtime", op, start))
+        else:
+            self.conditions.append(("mtime", "<" if op == "<=" else ">=", end))
+
+    def term_boolean(self, field, term, op, value):
+        if op != ":" or value.lower() not in BOOLEANS:
+            raise QueryError(f"Use yes or no: {term}")
+        self.conditions.append((field, "is", BOOLEANS[value.lower()]))
+
+    def term_encrypted(self, term, op, value):
+        self.term_boolean("encrypt", term, op, value)
+
+    def term_link(self, term, op, value):
+        self.term_boolean("link", term, op, value)
+
+    def term_tag(self, term, op, value):
+        if op != ":":
+            raise QueryError(f"Use tag:<tag query>: {term}")
+        try:
+            query = tag_query.parse(value)
+        except tag_query.TagQueryError as e:
+            raise QueryError(str(e))
+        self.tags = query if self.tags is None else ("and", [self.tags, query])
+
+    def term_title(self, term, op, value):
+        if op != ":":
+            raise QueryError(f"Use title:<regex>: {term}")
+        try:
+            re.compile(value)
+        except re.error as e:
+            raise QueryError(f"Bad title regex in {term}: {e}")
+        self.conditions.append(("title", "match", value))
+
+    def matches(self, data: Dict, conditions=None) -> bool:
+        """Whether an index record meets the conditions, ignoring tags."""
+        for field, op, value in self.conditions if conditions is None else conditions:
+            actual = data.get(field)
+            if op == "is":
+                if bool(actual) != value:
+                    return False
+            elif op == "in":
+                if actual not in value:
+                    return False
+            elif op == "match":
+                if not match(value, actual or "", False):
+                    return False
+            elif actual is None or not COMPARE[op](actual, value):
+                return False
+        return True
+
+    def to_sql(self) -> Tuple[str, List]:
+        """Return an SQL condition on the document table and its parameters."""
+        where = list()
+        params: List = list()
+        for field, op, value in self.conditions:
+            if op == "is":
+                where.append(f"{field} {'!=' if value else '='} 0")
+            elif op == "in":
+                where.append(f"{field} IN ({', '.join('?' * len(value))})")
+                params.extend(value)
+            elif op == "match":
+                where.append(f"match_title(?, {field}, 0)")
+                params.append(value)
+            else:
+                where.append(f"{field} {op} ?")
+                params.append(value)
+        if self.tags is not None:
+            sql, tag_params = tag_query.to_sql(self.tags)
+            where.append(f"({sql})")
+            params.extend(tag_params)
+        return " AND ".join(where) or "1", params
+
+
+def as_query(query) -> Optional[MetadataQuery]:
+    """Return a compiled query for a query string or a compiled query."""
+    if query is None or isinstance(query, MetadataQuery):
+        return query
+    return MetadataQuery(query)
@@ -10,6 +10,7 @@ from .utils import (
     get_sha_digest,
     modification_date,
     slugify,
+    write_json_atomic,
 )
 
 from . import file_system as fs
@@ -19,6 +20,24 @@ from . import file_system as fs
 DOC_KINDS = ["md", "txt", "rst", "json"]
 
 
+def read_tag_index(directory_path) -> List[str]:
+    """Read tag index of the document in directory_path into list."""
+    path = os.path.join(directory_path, "__tags.json")
+    if not os.path.exists(path):
+        return list()
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except json.decoder.JSONDecodeError:
+        print(f"Could not get tag index. Check file: {path}")
+
+
+def write_tag_index(directory_path, tag_index: List[str]) -> None:
+    """Replace the tag index of the document in directory_path."""
+    path = os.path.join(directory_path, "__tags.json")
+    write_json_atomic(path, tag_index, indent=4)
+
+
 class Document(object):
     """Describes a document."""
 
@@ -28,6 +47,8 @@ class Document(object):
         self.name = name
         self.kind = kind
         self.encrypt = encrypt
+        # the index record we were created from, if any
+        self.index_data: Optional[Dict] = None
 
     @property
     def directory_path(self):
@@ -43,20 +64,11 @@ class Document(object):
 
     def get_tag_index(self) -> List[str]:
         """Read document tag index into list."""
-        path = os.path.join(self.directory_path, "__tags.json")
-        if not os.path.exists(path):
-            return list()
-        try:
-            with open(path) as f:
-                return json.load(f)
-        except json.decoder.JSONDecodeError:
-            print(f"Could not get tag index. Check file: {path}")
+        return self.store.read_tag_index(self.directory_path)
 
     def write_tag_index(self, tag_index: List[str]) -> None:
-        """Write list of tags."""
-        path = os.path.join(self.directory_path, "__tags.json")
-        with open(path, "wt") as f:
-            f.write(json.dumps(tag_index, indent=4))
+        """Write list of tags, when the store's batch ends if in one."""
+        self.store.write_tag_index(self.directory_path, tag_index)
 
     def add_tag(self, tag: str) -> None:
         """Add tag to document."""
@@ -75,13 +87,11 @@ class Document(object):
         https://tools.ietf.org/html/rfc4880
         We should be safe and check the content.
         """
-        c = self.store.conn.cursor()
         content_start = self.get_content()[:100].strip()
-        encrypted = 1 if "BEGIN PGP MESSAGE" in content_start else 0
-        sql = "UPDATE document SET encrypt = ? WHERE uid = ?"
-        c.execute(sql, (encrypted, self.uid))
+        self.encrypt = 1 if "BEGIN PGP MESSAGE" in content_start else 0
+        self.store.reindex_doc(self)
         # return boolean
-        return encrypted == 1
+        return self.encrypt == 1
 
     def check_encrypted(self):
         return self.get_content().startswith("-----BEGIN PGP MESSAGE-----")
@@ -98,7 +108,7 @@ class Document(object):
         return slugify(self.name)
 
     def get_digest(self):
-        return self.store.digest_method(self.get_content())
+        return self.store.get_digest(self)
 
     def get_basename(self):
         return self.name
@@ -180,6 +190,28 @@ class Document(object):
         data["digest"] = self.digest
         return data
 
+    def get_stat_data(self) -> Dict:
+        """Size, modification time and link flag for the index.
+
+        size and mtime are None if the file does not exist.
+
+        """
+        link = os.path.islink(self.path)
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return {"size": None, "mtime": None, "link": link}
+        return {"size": stat.st_size, "mtime": stat.st_mtime, "link": link}
+
+    def get_index_data(self) -> Dict:
+        """Record for the document index."""
+        data = self.serialize(no_content=True)
+        data["tags"] = self.get_tag_index()
+        data["encrypt"] = self.encrypt
+        data.update(self.get_stat_data())
+        data["dir_mtime"] = os.stat(self.directory_path).st_mtime
+        return data
+
     def get_content(self):
         """Get the content."""
         f = codecs.open(self.path, "r", "utf-8")
@@ -191,6 +223,7 @@ class Document(object):
         f = codecs.open(self.path, mode, "utf-8")
         f.write(content)
         f.close()
+        self.store.reindex_doc(self)
 
     def __str__(self):
         return self.name
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Fuzzy title search.
+
+Titles are broken into case-folded trigrams, padded with a space at
+either end so word starts and ends count. A title's similarity to
+what the user typed is the Dice coefficient of their trigrams, with a
+bonus if the title equals, starts with or contains it, so typos still
+find a document and the closest titles come first.
+
+Building postings for every trigram of every title would cost more
+than a whole command on a large store, so the posting list of a
+trigram is only built when a search needs it, by searching all titles
+joined into one string, and then kept.
+
+"""
+from collections import Counter
+import bisect
+import heapq
+from itertools import chain
+import re
+from typing import Dict, List, Optional, Set, Tuple
+
+
+def ngrams(text: str, n=3) -> Set[str]:
+    padded = f" {text.casefold()} "
+    return {padded[i : i + n] for i in range(max(1, len(padded) - n + 1))}
+
+
+class FuzzyIndex(object):
+    """Trigram postings for a list of (uid, title), built as needed."""
+
+    def __init__(self, titles: List[Tuple[str, str]]):
+        self.uids = [uid for uid, _ in titles]
+        self.titles = [title.casefold() for _, title in titles]
+        self.postings: Dict[str, List[int]] = dict()
+        self._text: Optional[str] = None
+        self._starts: List[int] = list()
+
+    def posting(self, gram: str) -> List[int]:
+        """Return positions of the titles containing gram."""
+        if gram not in self.postings:
+            if self._text is None:
+                # titles can't contain a newline, so no trigram spans two
+                padded = [f" {title} " for title in self.titles]
+                self._text = "\n".join(padded)
+                self._starts = list()
+                start = 0
+                for title in padded:
+                    self._starts.append(start)
+                    start += len(title) + 1
+            positions = {
+                bisect.bisect_right(self._starts, m.start()) - 1
+                for m in re.finditer(re.escape(gram), self._text)
+            }
+            self.postings[gram] = sorted(positions)
+        return self.postings[gram]
+
+    def search(
+        self, text: str, limit: Optional[int] = None, uids: Optional[Set[str]] = None
+    ) -> List[str]:
+        """Return uids of titles sharing a trigram with text, best first.
+
+        uids restricts the result to those documents.
+
+        """
+        folded = text.casefold()
+        grams = ngrams(folded)
+        shared = Counter(chain.from_iterable(self.posting(g) for g in grams))
+        if uids is not None:
+            shared = Counter({i: n for i, n in shared.items() if self.uids[i] in uids})
+
+        def score(i):
+            title = self.titles[i]
+            # a title of n characters has about n trigrams
+            similarity = 2 * shared[i] / (len(grams) + max(1, len(title)))
+            if title == folded:
+                similarity += 1
+            elif title.startswith(folded):
+                similarity += 0.5
+            elif folded in title:
+                similarity += 0.25
+            # earlier documents first among equals
+            return similarity, -i
+
+        if limit is None:
+            best = sorted(shared, key=score, reverse=True)
+        else:
+            best = heapq.nlargest(limit, shared, key=score)
+        return [self.uids[i] for i in best]
@@ -0,0 +1,674 @@
+# -*- coding: utf-8 -*-
+"""
+In-memory document index.
+
+index.json is a list of document records. In memory we key the
+records on uid so lookups don't need to scan the list. We also keep a
+sorted list of uids so abbreviated uids can be resolved with a binary
+search, and a map of tag to the set of uids with that tag so tag
+filters and counts are set operations. Titles are hashed for exact
+lookups; a case-folded title column and a sorted prefix index are built
+when a title search needs them. Boolean tag queries, see
+tag_query, are evaluated over a bitmap per tag, with one bit per
+record in index order.
+
+ColumnarIndex additionally keeps numeric fields in typed arrays, so
+sorting and filtering large indexes are array operations. Select it
+with the user pref ``index_engine`` set to ``columnar``.
+
+Alternatively the index can be kept in a SQLite database, see
+SqliteIndex. Select it with the user pref ``index_engine`` set to
+``sqlite``. Tag queries are then translated to SQL.
+
+"""
+from array import array
+import bisect
+import functools
+import json
+import math
+import re
+import sqlite3
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from . import tag_query
+from .fuzzy import FuzzyIndex
+from .search import is_literal
+
+# NumPy is optional and slow to import, so it is only imported when
+# the columnar index first needs it; None if it isn't installed
+numpy: Any = False
+
+
+def load_numpy():
+    global numpy
+    if numpy is False:
+        try:
+            import numpy as module
+        except ImportError:
+            module = None
+        numpy = module
+    return numpy
+
+
+@functools.lru_cache(maxsize=64)
+def title_matcher(frag: str, exact=False) -> Callable[[str], bool]:
+    """Return a test of titles against frag, compiled once per frag.
+
+    Exact matching compares titles with frag. Otherwise frag is a
+    regular expression searched for ignoring case, or, if it has no
+    special characters, a string looked for in the case-folded title.
+
+    """
+    if exact:
+        return lambda title: title == frag
+    if is_literal(frag):
+        folded = frag.casefold()
+        return lambda title: folded in title.casefold()
+    search = re.compile(frag, re.IGNORECASE).search
+    return lambda title: search(title) is not None
+
+
+def prefix_literal(frag: str) -> Optional[str]:
+    """Return the prefix if frag is a regex like ^prefix, else None."""
+    if frag.startswith("^") and len(frag) > 1 and is_literal(frag[1:]):
+        return frag[1:]
+    return None
+
+
+def match(frag, s, exact):
+    """Match a search string frag with string s.
+
+    This is how we match document titles/names.
+
+    """
+    return title_matcher(frag, bool(exact))(s)
+
+
+class DocIndex(object):
+    """Document records keyed on uid.
+
+    Record dicts are shared with callers, but changes must go through
+    put() and remove() so the uid list, title and tag postings stay in
+    sync and the change is queued in pending for the index journal.
+
+    """
+
+    def __init__(self, records: Optional[List[Dict]] = None):
+        self.pending: List[Dict] = list()
+        self.records: Dict[str, Dict] = dict()
+        # tag -> uids, and the tags each uid is posted under
+        self.tag_uids: Dict[str, Set[str]] = dict()
+        self.uid_tags: Dict[str, Set[str]] = dict()
+        # built on the first tag query after a change, see bitmaps()
+        self._bitmaps: Optional[Dict[str, int]] = None
+        self._ordered: List[str] = list()
+        # title -> uids in index order, and the title of each uid
+        self.title_uids: Dict[str, List[str]] = dict()
+        self.uid_title: Dict[str, str] = dict()
+        # built on the first title search after a change, see title_columns()
+        self._title_columns: Optional[Tuple] = None
+        self._fuzzy: Optional[FuzzyIndex] = None
+        for data in records or list():
+            self.records[data["uid"]] = data
+            self.post_tags(data)
+            self.post_title(data)
+        self.uids: List[str] = sorted(self.records)
+
+    def post_title(self, data: Dict) -> None:
+        uid = data["uid"]
+        title = data["title"]
+        if self.uid_title.get(uid) == title:
+            return
+        self.unpost_title(uid)
+        self.uid_title[uid] = title
+        self.title_uids.setdefault(title, list()).append(uid)
+
+    def unpost_title(self, uid: str) -> None:
+        self._title_columns = None
+        self._fuzzy = None
+        title = self.uid_title.pop(uid, None)
+        if title is None:
+            return
+        uids = self.title_uids[title]
+        uids.remove(uid)
+        if not uids:
+            del self.title_uids[title]
+
+    def post_tags(self, data: Dict) -> None:
+        uid = data["uid"]
+        tags = set(data.get("tags") or list())
+        if tags == self.uid_tags.get(uid, set()):
+            return
+        self.unpost_tags(uid)
+        if tags:
+            self.uid_tags[uid] = tags
+        for tag in tags:
+            self.tag_uids.setdefault(tag, set()).add(uid)
+
+    def unpost_tags(self, uid: str) -> None:
+        self._bitmaps = None
+        for tag in self.uid_tags.pop(uid, set()):
+            uids = self.tag_uids[tag]
+            uids.discard(uid)
+            if not uids:
+                del self.tag_uids[tag]
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __contains__(self, uid) -> bool:
+        return uid in self.records
+
+    def __iter__(self) -> Iterator[Dict]:
+        return iter(self.records.values())
+
+    def get(self, uid: str) -> Optional[Dict]:
+        """Return record for uid or None."""
+        return self.records.get(uid)
+
+    def put(self, data: Dict) -> Dict:
+        """Insert or replace the record for data["uid"]."""
+        uid = data["uid"]
+        if uid not in self.records:
+            bisect.insort(self.uids, uid)
+            self._bitmaps = None
+        self.records[uid] = data
+        self.post_tags(data)
+        self.post_title(data)
+        self.pending.append({"op": "put", "data": data})
+        return data
+
+    def remove(self, uid: str) -> Optional[Dict]:
+        """Remove record for uid; return it or None if not indexed."""
+        data = self.records.pop(uid, None)
+        if data is not None:
+            i = bisect.bisect_left(self.uids, uid)
+            del self.uids[i]
+            self.unpost_tags(uid)
+            self.unpost_title(uid)
+            self._bitmaps = None
+            self.pending.append({"op": "remove", "uid": uid})
+        return data
+
+    def find_short(self, prefix: str) -> Optional[Dict]:
+        """Return the first record whose uid starts with prefix."""
+        i = bisect.bisect_left(self.uids, prefix)
+        if i < len(self.uids) and self.uids[i].startswith(prefix):
+            return self.records[self.uids[i]]
+        return None
+
+    def bitmaps(self) -> Dict[str, int]:
+        """Return tag bitmaps, building them if the index changed.
+
+        Bit i stands for the i'th record in index order.
+
+        """
+        if self._bitmaps is None:
+            self._ordered = list(self.records)
+            ordinals = {uid: i for i, uid in enumerate(self._ordered)}
+            size = len(self._ordered)
+            self._bitmaps = {
+                tag: tag_query.bitmap_from_positions(
+                    [ordinals[uid] for uid in uids], size
+                )
+                for tag, uids in self.tag_uids.items()
+            }
+        return self._bitmaps
+
+    def query_tags(self, query: Tuple) -> List[Dict]:
+        """Return records matching a tag query, in index order."""
+        bitmaps = self.bitmaps()
+        universe = (1 << len(self._ordered)) - 1
+        bits = tag_query.evaluate(query, lambda tag: bitmaps.get(tag, 0), universe)
+        return [
+            self.records[self._ordered[i]] for i in tag_query.bit_positions(bits)
+        ]
+
+    def tag_counts(self) -> Dict[str, int]:
+        """Return number of records for each tag."""
+        return {tag: len(uids) for tag, uids in self.tag_uids.items()}
+
+    def tagged_count(self) -> int:
+        """Return number of records with any tag."""
+        return len(self.uid_tags)
+
+    def find_title(self, title: str) -> List[Dict]:
+        """Return records with exactly this title."""
+        return [self.records[uid] for uid in self.title_uids.get(title, list())]
+
+    def title_columns(self) -> Tuple[List[str], List[str], List[Tuple[str, int]]]:
+        """Return uids and case-folded titles in index order, and a prefix index.
+
+        The prefix index is the folded titles sorted, each with its position.
+
+        """
+        if self._title_columns is None:
+            uids = list(self.records)
+            folded = [self.records[uid]["title"].casefold() for uid in uids]
+            prefixes = sorted(zip(folded, range(len(folded))))
+            self._title_columns = (uids, folded, prefixes)
+        return self._title_columns
+
+    def fuzzy_titles(self) -> FuzzyIndex:
+        """Return fuzzy title index, built on first use after a change."""
+        if self._fuzzy is None:
+            titles = [(uid, data["title"]) for uid, data in self.records.items()]
+            self._fuzzy = FuzzyIndex(titles)
+        return self._fuzzy
+
+    def match_titles(
+        self, frag: str, exact=False, records: Optional[Iterable[Dict]] = None
+    ) -> List[Dict]:
+        """Return records whose title matches frag, see title_matcher().
+
+        records defaults to all records, in which case exact titles are
+        looked up, ^prefix searches use the prefix index and other
+        strings are searched for in the case-folded titles.
+
+        """
+        if records is not None:
+            matches = title_matcher(frag, exact)
+            return [data for data in records if matches(data["title"])]
+        if exact:
+            return self.find_title(frag)
+        uids, folded, prefixes = self.title_columns()
+        prefix = prefix_literal(frag)
+        if prefix is not None:
+            prefix = prefix.casefold()
+            positions = list()
+            i = bisect.bisect_left(prefixes, (prefix,))
+            while i < len(prefixes) and prefixes[i][0].startswith(prefix):
+                positions.append(prefixes[i][1])
+                i += 1
+            positions.sort()
+        elif is_literal(frag):
+            frag = frag.casefold()
+            positions = [i for i, title in enumerate(folded) if frag in title]
+        else:
+            matches = title_matcher(frag)
+            return [data for data in self if matches(data["title"])]
+        return [self.records[uids[i]] for i in positions]
+
+    def sort_records(self, records: List[Dict], field: str, descending=False):
+        """Return records sorted on field, missing values first."""
+        if field == "title":
+            return sorted(records, key=lambda data: data["title"], reverse=descending)
+        return sorted(
+            records, key=lambda data: data.get(field) or 0, reverse=descending
+        )
+
+    def match_query(self, query, records: Optional[Iterable[Dict]] = None):
+        """Return records meeting the conditions of a doc_query.MetadataQuery.
+
+        records defaults to all records.
+
+        """
+        return list(filter(query.matches, self if records is None else records))
+
+    def replace(self, records: List[Dict]) -> None:
+        """Replace all records."""
+        self.__init__(records)
+
+    def lacking(self, fields: Iterable[str]) -> List[Dict]:
+        """Return records without a value for any of fields."""
+        return [
+            data
+            for data in self.records.values()
+            if any(data.get(field) is None for field in fields)
+        ]
+
+    def to_list(self) -> List[Dict]:
+        """Records in the order they were indexed, as stored in index.json."""
+        return list(self.records.values())
+
+
+# fields kept in columns, with missing values as NaN
+NUMERIC_FIELDS = ["size", "mtime"]
+FLAG_FIELDS = ["link", "encrypt"]
+COLUMN_FIELDS = ["kind"] + NUMERIC_FIELDS + FLAG_FIELDS
+
+
+class ColumnarIndex(DocIndex):
+    """DocIndex that also keeps size, mtime, kind and flags in columns.
+
+    Column i holds the value for the i'th record in index order. Kinds
+    are stored as codes into self.kinds. The columns are NumPy arrays
+    if NumPy is installed, otherwise array module arrays, and are built
+    on first use after a change.
+
+    With NumPy, sorting and filtering on columns are vectorized;
+    without it we still sort on the compact columns but filter the
+    records.
+
+    """
+
+    def __init__(self, records: Optional[List[Dict]] = None):
+        self._columns: Optional[Dict[str, Any]] = None
+        super().__init__(records)
+
+    def put(self, data: Dict) -> Dict:
+        self._columns = None
+        return super().put(data)
+
+    def remove(self, uid: str) -> Optional[Dict]:
+        self._columns = None
+        return super().remove(uid)
+
+    def columns(self) -> Dict[str, Any]:
+        if self._columns is None:
+            records = list(self.records.values())
+            kinds: Dict[str, int] = dict()
+            codes = [kinds.setdefault(data["kind"], len(kinds)) for data in records]
+            columns: Dict[str, Any] = {"uid": list(self.records)}
+            if load_numpy() is not None:
+                # numpy turns None into NaN for floats and False for bools
+                columns["kind"] = numpy.array(codes, dtype=numpy.uint16)
+                for field in NUMERIC_FIELDS:
+                    values = [data.get(field) for data in records]
+                    columns[field] = numpy.array(values, dtype=float)
+                for field in FLAG_FIELDS:
+                    values = [data.get(field) for data in records]
+                    columns[field] = numpy.array(values, dtype=bool)
+            else:
+                columns["kind"] = array("H", codes)
+                for field in NUMERIC_FIELDS:
+                    values = [data.get(field) for data in records]
+                    columns[field] = array(
+                        "d", [math.nan if v is None else v for v in values]
+                    )
+                for field in FLAG_FIELDS:
+                    values = [bool(data.get(field)) for data in records]
+                    columns[field] = array("b", values)
+            self.kinds = list(kinds)
+            self._columns = columns
+        return self._columns
+
+    def positions(self, records: List[Dict]) -> List[int]:
+        columns = self.columns()
+        if "ordinals" not in columns:
+            columns["ordinals"] = {uid: i for i, uid in enumerate(columns["uid"])}
+        ordinals = columns["ordinals"]
+        return [ordinals[data["uid"]] for data in records]
+
+    def sort_records(self, records: List[Dict], field: str, descending=False):
+        """Return records sorted on field; equal ones keep their order."""
+        if field not in NUMERIC_FIELDS:
+            return super().sort_records(records, field, descending)
+        columns = self.columns()
+        column = columns[field]
+        uids = columns["uid"]
+        if len(records) == len(self) and all(
+            data["uid"] == uid for data, uid in zip(records, uids)
+        ):
+            # all records, in index order
+            positions = None
+        else:
+            positions = self.positions(records)
+        if load_numpy() is not None:
+            keys = numpy.nan_to_num(column if positions is None else column[positions])
+            # a stable sort, like sorted() with reverse
+            order = numpy.argsort(-keys if descending else keys, kind="stable")
+            return [records[i] for i in order.tolist()]
+        if positions is None:
+            keys = [0 if math.isnan(v) else v for v in column]
+        else:
+            keys = [0 if math.isnan(column[i]) else column[i] for i in positions]
+        order = sorted(range(len(keys)), key=keys.__getitem__, reverse=descending)
+        return [records[i] for i in order]
+
+    def condition_mask(self, field, op, value):
+        """Evaluate a query condition over a column, with NumPy."""
+        column = self.columns()[field]
+        if op == "is":
+            return column != 0 if value else column == 0
+        if op == "in":
+            codes = [self.kinds.index(kind) for kind in value if kind in self.kinds]
+            return numpy.isin(column, codes)
+        # comparisons with NaN are false, like with missing values
+        return {
+            "=": numpy.equal,
+            "<": numpy.less,
+            "<=": numpy.less_equal,
+            ">": numpy.greater,
+            ">=": numpy.greater_equal,
+        }[op](column, value)
+
+    def match_query(self, query, records: Optional[Iterable[Dict]] = None):
+        columnar = [c for c in query.conditions if c[0] in COLUMN_FIELDS]
+        if not columnar or load_numpy() is None:
+            return super().match_query(query, records)
+        mask = numpy.ones(len(self), dtype=bool)
+        for condition in columnar:
+            mask &= self.condition_mask(*condition)
+        rest = [c for c in query.conditions if c not in columnar]
+        if records is None:
+            uids = self.columns()["uid"]
+            matching = [self.records[uids[i]] for i in numpy.flatnonzero(mask)]
+        else:
+            records = list(records)
+            selected = mask[self.positions(records)].tolist()
+            matching = [data for data, m in zip(records, selected) if m]
+        if rest:
+            matching = [data for data in matching if query.matches(data, rest)]
+        return matching
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS document (
+    id INTEGER PRIMARY KEY,
+    uid TEXT NOT NULL UNIQUE,
+    title TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    digest TEXT,
+    size INTEGER,
+    mtime REAL,
+    link INTEGER NOT NULL DEFAULT 0,
+    encrypt INTEGER NOT NULL DEFAULT 0,
+    dir_mtime REAL
+);
+CREATE INDEX IF NOT EXISTS document_title ON document (title);
+CREATE INDEX IF NOT EXISTS document_size ON document (size);
+CREATE INDEX IF NOT EXISTS document_mtime ON document (mtime);
+CREATE TABLE IF NOT EXISTS document_tag (
+    uid TEXT NOT NULL,
+    tag TEXT NOT NULL,
+    PRIMARY KEY (uid, tag)
+);
+CREATE INDEX IF NOT EXISTS document_tag_tag ON document_tag (tag);
+"""
+
+COLUMNS = [
+    "uid",
+    "title",
+    "kind",
+    "digest",
+    "size",
+    "mtime",
+    "link",
+    "encrypt",
+    "dir_mtime",
+]
+
+SELECT_RECORDS = """
+SELECT uid, title, kind, digest, size, mtime, link, encrypt, dir_mtime,
+    (SELECT json_group_array(tag) FROM document_tag t WHERE t.uid = d.uid) AS tags
+FROM document d
+"""
+
+# get_docs() sort keys mapped to columns
+ORDER_COLUMNS = {"size": "size", "updated": "mtime", "title": "title"}
+
+
+def record_from_row(row) -> Dict:
+    data = dict(zip(COLUMNS, row))
+    data["link"] = bool(data["link"])
+    data["tags"] = json.loads(row[-1]) if row[-1] else list()
+    return data
+
+
+class SqliteIndex(object):
+    """Document records in a SQLite database.
+
+    Has the same interface as DocIndex, but records returned are
+    copies: use put() to change a record. Changes are visible
+    immediately but only persisted by commit().
+
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.create_function(
+            "match_title",
+            3,
+            lambda frag, s, exact: match(frag, s, exact),
+            deterministic=True,
+        )
+        self.conn.executescript(SCHEMA)
+        self.migrate()
+        self._fuzzy: Optional[FuzzyIndex] = None
+
+    def migrate(self) -> None:
+        """Add columns missing from databases created by older versions."""
+        existing = [row[1] for row in self.conn.execute("PRAGMA table_info(document)")]
+        if "link" not in existing:
+            self.conn.execute(
+                "ALTER TABLE document ADD COLUMN link INTEGER NOT NULL DEFAULT 0"
+            )
+        if "dir_mtime" not in existing:
+            self.conn.execute("ALTER TABLE document ADD COLUMN dir_mtime REAL")
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT count(*) FROM document").fetchone()[0]
+
+    def __contains__(self, uid) -> bool:
+        sql = "SELECT 1 FROM document WHERE uid = ?"
+        return self.conn.execute(sql, (uid,)).fetchone() is not None
+
+    def __iter__(self) -> Iterator[Dict]:
+        return iter(self.select())
+
+    def get(self, uid: str) -> Optional[Dict]:
+        """Return record for uid or None."""
+        row = self.conn.execute(SELECT_RECORDS + " WHERE uid = ?", (uid,)).fetchone()
+        return record_from_row(row) if row else None
+
+    def put(self, data: Dict) -> Dict:
+        """Insert or replace the record for data["uid"]."""
+        values = [data.get(c) for c in COLUMNS]
+        values[COLUMNS.index("link")] = int(bool(data.get("link")))
+        values[COLUMNS.index("encrypt")] = data.get("encrypt") or 0
+        updates = ", ".join(f"{c} = excluded.{c}" for c in COLUMNS[1:])
+        self.conn.execute(
+            f"INSERT INTO document ({', '.join(COLUMNS)}) "
+            f"VALUES ({', '.join('?' * len(COLUMNS))}) "
+            f"ON CONFLICT (uid) DO UPDATE SET {updates}",
+            values,
+        )
+        self.conn.execute("DELETE FROM document_tag WHERE uid = ?", (data["uid"],))
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO document_tag (uid, tag) VALUES (?, ?)",
+            [(data["uid"], tag) for tag in data.get("tags") or list()],
+        )
+        self._fuzzy = None
+        return data
+
+    def remove(self, uid: str) -> Optional[Dict]:
+        """Remove record for uid; return it or None if not indexed."""
+        data = self.get(uid)
+        if data is not None:
+            self.conn.execute("DELETE FROM document WHERE uid = ?", (uid,))
+            self.conn.execute("DELETE FROM document_tag WHERE uid = ?", (uid,))
+            self._fuzzy = None
+        return data
+
+    def find_title(self, title: str) -> List[Dict]:
+        """Return records with exactly this title."""
+        sql = SELECT_RECORDS + " WHERE title = ? ORDER BY id"
+        return [record_from_row(row) for row in self.conn.execute(sql, (title,))]
+
+    def fuzzy_titles(self) -> FuzzyIndex:
+        """Return fuzzy title index, built on first use after a change."""
+        if self._fuzzy is None:
+            sql = "SELECT uid, title FROM document ORDER BY id"
+            self._fuzzy = FuzzyIndex(self.conn.execute(sql).fetchall())
+        return self._fuzzy
+
+    def find_short(self, prefix: str) -> Optional[Dict]:
+        """Return the first record whose uid starts with prefix."""
+        sql = SELECT_RECORDS + " WHERE uid >= ? ORDER BY uid LIMIT 1"
+        row = self.conn.execute(sql, (prefix,)).fetchone()
+        if row and row[0].startswith(prefix):
+            return record_from_row(row)
+        return None
+
+    def select(
+        self,
+        name_frag: Optional[str] = None,
+        tags=None,
+        exact=False,
+        order_by: Optional[str] = None,
+        descending=False,
+        query=None,
+    ) -> List[Dict]:
+        """Query records matching name_frag, tags and query.
+
+        tags is a list of tags, any of which must match, or a tag query.
+        query is a doc_query.MetadataQuery.
+
+        """
+        where = list()
+        params: List = list()
+        if name_frag and exact:
+            where.append("title = ?")
+            params.append(name_frag)
+        elif name_frag:
+            where.append("match_title(?, title, 0)")
+            params.append(name_frag)
+        if tags:
+            tag_sql, tag_params = tag_query.to_sql(tag_query.as_query(tags))
+            where.append(f"({tag_sql})")
+            params.extend(tag_params)
+        if query:
+            query_sql, query_params = query.to_sql()
+            where.append(f"({query_sql})")
+            params.extend(query_params)
+        sql = SELECT_RECORDS
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        column = ORDER_COLUMNS.get(order_by, "id")
+        sql += f" ORDER BY {column} {'DESC' if descending else 'ASC'}"
+        return [record_from_row(row) for row in self.conn.execute(sql, params)]
+
+    def tag_counts(self) -> Dict[str, int]:
+        """Return number of records for each tag."""
+        sql = "SELECT tag, count(*) FROM document_tag GROUP BY tag"
+        return dict(self.conn.execute(sql).fetchall())
+
+    def tagged_count(self) -> int:
+        """Return number of records with any tag."""
+        sql = "SELECT count(DISTINCT uid) FROM document_tag"
+        return self.conn.execute(sql).fetchone()[0]
+
+    def lacking(self, fields: Iterable[str]) -> List[Dict]:
+        """Return records without a value for any of fields."""
+        where = " OR ".join(f"{field} IS NULL" for field in fields)
+        if not where:
+            return list()
+        rows = self.conn.execute(f"{SELECT_RECORDS} WHERE {where}").fetchall()
+        return [record_from_row(row) for row in rows]
+
+    def replace(self, records: List[Dict]) -> None:
+        """Replace all records."""
+        self.conn.execute("DELETE FROM document")
+        self.conn.execute("DELETE FROM document_tag")
+        for data in records:
+            self.put(data)
+        self.commit()
+
+    def to_list(self) -> List[Dict]:
+        """Records in the order they were indexed."""
+        return self.select()
+
+    def commit(self) -> None:
+        self.conn.commit()
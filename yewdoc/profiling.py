@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+Timing of a yd invocation, for yd --profile.
+
+The phases of startup are always timed with phase(), which costs next
+to nothing. With --profile a Profiler also runs cProfile over the
+command and, when it finishes, writes the stats and prints how long
+each phase took.
+
+"""
+from contextlib import contextmanager
+import cProfile
+import time
+from typing import Dict, Iterator
+
+# when yewdoc was first imported
+STARTED = time.perf_counter()
+
+# seconds spent in each phase of this invocation
+PHASES: Dict[str, float] = dict()
+
+# phases to report, with those that are part of another indented; the
+# command is whatever time none of the others account for
+REPORT = [
+    ("import command", ""),
+    ("store", ""),
+    ("prefs", "  "),
+    ("index", "  "),
+    ("remote", ""),
+    ("flush", ""),
+]
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        PHASES[name] = PHASES.get(name, 0) + time.perf_counter() - start
+
+
+class Profiler(object):
+    """cProfile from now until report is called."""
+
+    def __init__(self, path: str):
+        self.path = path
+        # only count phases of this command
+        PHASES.clear()
+        self.profile = cProfile.Profile()
+        self.started = time.perf_counter()
+        self.profile.enable()
+
+    def report(self) -> None:
+        """Stop profiling, write stats to path and print the phases."""
+        self.profile.disable()
+        # not at the top, as everything imports this module
+        import click
+
+        now = time.perf_counter()
+        self.profile.dump_stats(self.path)
+        total = now - STARTED
+        timings = [("import yewdoc", "", self.started - STARTED)]
+        timings.extend(
+            (name, indent, PHASES[name]) for name, indent in REPORT if name in PHASES
+        )
+        accounted = sum(seconds for _, indent, seconds in timings if not indent)
+        timings.append(("command", "", total - accounted))
+        for name, indent, seconds in timings:
+            name = f"{indent}{name}"
+            click.echo(f"{name:16}{seconds * 1000:9.1f}ms", err=True)
+        click.echo(f"{'total':16}{total * 1000:9.1f}ms", err=True)
+        click.echo(f"profile written to {self.path}", err=True)
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+Recently used documents.
+
+The uids of the last documents shown, edited or created are kept in
+recent.json in the user directory, most recent first. The list is a
+ring of at most size uids: touching a document puts it at the front
+and the oldest one drops off the end, so an update costs the same
+however many documents the store has, and the file stays small.
+
+"""
+from collections import deque
+import os
+from typing import Deque, Iterable, Optional
+
+from .utils import read_json, write_json_atomic
+
+# uids remembered unless the recent_size user pref says otherwise
+RECENT_SIZE = 20
+
+
+class RecentList(object):
+    """Bounded list of uids, most recent first."""
+
+    def __init__(self, path: str, size: int = RECENT_SIZE):
+        self.path = path
+        self.size = max(1, size)
+        self.dirty = False
+        self._uids: Optional[Deque[str]] = None
+
+    @property
+    def uids(self) -> Deque[str]:
+        if self._uids is None:
+            uids = read_json(self.path, list(), "Ignoring damaged recent list")
+            self._uids = deque(uids, maxlen=self.size)
+        return self._uids
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def touch(self, uid: str) -> None:
+        """Put uid at the front and save."""
+        uids = self.uids
+        if uids and uids[0] == uid:
+            return
+        if uid in uids:
+            uids.remove(uid)
+        uids.appendleft(uid)
+        self.dirty = True
+        self.save()
+
+    def extend(self, uids: Iterable[str]) -> None:
+        """Add uids after the ones we have, oldest last, and save."""
+        for uid in uids:
+            if uid not in self.uids and len(self.uids) < self.size:
+                self.uids.append(uid)
+        self.dirty = True
+        self.save()
+
+    def remove(self, uid: str) -> None:
+        """Drop uid; save writes the change."""
+        if uid in self.uids:
+            self.uids.remove(uid)
+            self.dirty = True
+
+    def save(self) -> None:
+        """Write the list if anything changed."""
+        if not self.dirty:
+            return
+        write_json_atomic(self.path, list(self.uids))
+        self.dirty = False
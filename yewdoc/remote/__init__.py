@@ -1,6 +1,88 @@
+"""
+Remotes, looked up by the location.default.remote_type user pref.
+
+A remote module is only imported when its remote is asked for, so the
+S3 remote's s3fs stack isn't loaded for users of the REST remote.
+
+Other packages can add remotes with entry points in the yewdoc.remotes
+group, for instance in setup.py:
+
+    entry_points={"yewdoc.remotes": ["RemoteWebDAV = yd_webdav:RemoteWebDAV"]}
+
+"""
+from collections.abc import Mapping
+import importlib
+from typing import Dict, Iterator, Optional
+
 from .constants import RemoteStatus, STATUS_MSG
-from .remote import Remote
-from .s3remote import RemoteS3
 from .exceptions import OfflineException, RemoteException
 
-REMOTES = {"RemoteREST": Remote, "RemoteS3": RemoteS3}
+ENTRY_POINT_GROUP = "yewdoc.remotes"
+
+# built in remotes, as module:class relative to this package
+BUILTIN_REMOTES = {
+    "RemoteREST": ".remote:Remote",
+    "RemoteS3": ".s3remote:RemoteS3",
+}
+
+
+def entry_points() -> Dict:
+    """Return remotes other packages declare, as name: entry point."""
+    from importlib import metadata
+
+    points = metadata.entry_points()
+    if hasattr(points, "select"):
+        found = points.select(group=ENTRY_POINT_GROUP)
+    else:
+        found = points.get(ENTRY_POINT_GROUP, [])
+    return {point.name: point for point in found}
+
+
+class RemoteRegistry(Mapping):
+    """Remote classes by name, imported on first lookup."""
+
+    def __init__(self, builtins: Dict[str, str]):
+        self.builtins = builtins
+        self.loaded: Dict[str, type] = dict()
+        self._entry_points: Optional[Dict] = None
+
+    @property
+    def entry_points(self) -> Dict:
+        # reading package metadata is slow, so only if we must
+        if self._entry_points is None:
+            self._entry_points = entry_points()
+        return self._entry_points
+
+    def __getitem__(self, name: str) -> type:
+        if name not in self.loaded:
+            if name in self.builtins:
+                module_name, class_name = self.builtins[name].split(":")
+                module = importlib.import_module(module_name, __name__)
+                self.loaded[name] = getattr(module, class_name)
+            elif name in self.entry_points:
+                self.loaded[name] = self.entry_points[name].load()
+            else:
+                raise KeyError(name)
+        return self.loaded[name]
+
+    def __contains__(self, name) -> bool:
+        return name in self.builtins or name in self.entry_points
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self.builtins
+        yield from (name for name in self.entry_points if name not in self.builtins)
+
+    def __len__(self) -> int:
+        return len(set(self.builtins) | set(self.entry_points))
+
+
+REMOTES = RemoteRegistry(BUILTIN_REMOTES)
+
+
+def __getattr__(name):
+    # keep from yewdoc.remote import Remote, RemoteS3 working
+    if name == "Remote":
+        return REMOTES["RemoteREST"]
+    if name == "RemoteS3":
+        return REMOTES["RemoteS3"]
+    raise AttributeError(f"module {__name__} has no attribute {name}")
@@ -329,10 +329,10 @@ class RemoteS3(object):
         remote_tags = self.pull_tags()
         tag_docs = self.pull_tag_associations()
         print(f"Applying remote tags on local docs: {len(tag_docs)}")
-        for tag_doc in tag_docs:
-            tag_name = remote_tags[tag_doc["tid"]]
-            doc = self.store.get_doc(tag_doc["uid"])
-            # print(f"{tag_name} => {doc}")
-            doc.add_tag(tag_name)
-            self.store.reindex_doc(doc, write_index_flag=False)
-        self.store.write_index()
+        with self.store.batch():
+            for tag_doc in tag_docs:
+                tag_name = remote_tags[tag_doc["tid"]]
+                doc = self.store.get_doc(tag_doc["uid"])
+                # print(f"{tag_name} => {doc}")
+                doc.add_tag(tag_name)
+                self.store.reindex_doc(doc)
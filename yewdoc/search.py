@@ -0,0 +1,511 @@
+# -*- coding: utf-8 -*-
+"""
+Full text search of document contents.
+
+WordIndex is an inverted index: each word maps to the documents it
+occurs in and its positions there. TrigramIndex maps each sequence of
+three characters to the documents containing it; it narrows down
+candidates for regular expressions using the literal strings any match
+must contain.
+
+The indexes live in the user directory and are only loaded when we
+search. Each document's entry remembers the digest it was built from,
+so bringing an index up to date only reads documents whose digest
+changed.
+
+The indexes narrow down the documents that might match; matching is
+always confirmed against the document content. Documents are scanned
+as memory mapped bytes where that gives the same result as matching the
+decoded text, optionally by a pool of processes.
+
+"""
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import codecs
+import functools
+import mmap
+import os
+import re
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+try:
+    from re import _constants as sre_constants
+    from re import _parser as sre_parse
+except ImportError:
+    # before python 3.11
+    import sre_constants  # type: ignore
+    import sre_parse  # type: ignore
+
+from .utils import read_json, write_json_atomic
+
+TOKEN_RE = re.compile(r"\w+")
+
+# characters that make a spec a regular expression rather than a string
+REGEX_CHARS = set(".^$*+?{}[]\\|()")
+
+
+# most files a scanning process is handed at a time
+SCAN_BATCH = 64
+
+
+def tokenize(text: str) -> List[str]:
+    # casefold, not lower, which depends on context for the greek sigma
+    return TOKEN_RE.findall(text.casefold())
+
+
+def is_literal(spec: str) -> bool:
+    """Whether the regular expression spec only matches itself."""
+    return not REGEX_CHARS.intersection(spec)
+
+
+def content_matcher(spec, string_only=False, insensitive=False) -> Callable:
+    """Return function that tests document content against spec."""
+    if string_only:
+        if insensitive:
+            spec = spec.casefold()
+            return lambda content: spec in content.casefold()
+        return lambda content: spec in content
+    regex = re.compile(spec, re.IGNORECASE if insensitive else 0)
+    return lambda content: regex.search(content) is not None
+
+
+REPEATS = {
+    sre_constants.MAX_REPEAT,
+    sre_constants.MIN_REPEAT,
+    getattr(sre_constants, "POSSESSIVE_REPEAT", sre_constants.MAX_REPEAT),
+}
+
+
+def regex_literals(spec: str) -> List[str]:
+    """Return strings that any match of the regular expression spec contains.
+
+    This is conservative: alternatives and optional parts of the
+    expression contribute nothing.
+
+    """
+    try:
+        pattern = sre_parse.parse(spec)
+    except re.error:
+        return list()
+    literals: List[str] = list()
+    run = collect_literals(pattern, literals, "")
+    if run:
+        literals.append(run)
+    return literals
+
+
+def collect_literals(pattern, literals: List[str], run: str) -> str:
+    """Add required literal strings in pattern to literals.
+
+    run is the literal string we are in the middle of when entering
+    pattern; return the one we are in the middle of at the end.
+
+    """
+    for op, arg in pattern:
+        if op is sre_constants.LITERAL:
+            run += chr(arg)
+            continue
+        if op is sre_constants.SUBPATTERN:
+            run = collect_literals(arg[-1], literals, run)
+            continue
+        if run:
+            literals.append(run)
+            run = ""
+        if op in REPEATS and arg[0] >= 1:
+            tail = collect_literals(arg[2], literals, "")
+            if tail:
+                literals.append(tail)
+    return run
+
+
+def trigrams(text: str) -> Set[str]:
+    text = text.casefold()
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+# regex syntax matching one character, which is not one byte in utf-8,
+# or word boundaries, which are ascii only for bytes
+CHARACTER_OPS = {
+    sre_constants.ANY,
+    sre_constants.CATEGORY,
+    sre_constants.NEGATE,
+    sre_constants.NOT_LITERAL,
+}
+WORD_BOUNDARIES = {sre_constants.AT_BOUNDARY, sre_constants.AT_NON_BOUNDARY}
+
+
+def bytes_safe(pattern) -> bool:
+    """Whether parsed pattern matches the same as bytes as it does as text."""
+    for op, arg in pattern:
+        if op in CHARACTER_OPS:
+            return False
+        if op is sre_constants.AT and arg in WORD_BOUNDARIES:
+            return False
+        # \xe9 or [\xe0-\xff] are code points as text but bytes as bytes
+        if op is sre_constants.LITERAL and arg >= 0x80:
+            return False
+        if op is sre_constants.RANGE and arg[1] >= 0x80:
+            return False
+        if op is sre_constants.SUBPATTERN and arg[1] & re.IGNORECASE:
+            return False
+        if op is sre_constants.IN:
+            if not bytes_safe(arg):
+                return False
+            continue
+        values = arg if isinstance(arg, (list, tuple)) else [arg]
+        for value in values:
+            # BRANCH has a list of alternatives
+            subpatterns = value if isinstance(value, list) else [value]
+            for subpattern in subpatterns:
+                if isinstance(subpattern, sre_parse.SubPattern):
+                    if not bytes_safe(subpattern):
+                        return False
+    return True
+
+
+def bytes_pattern(spec, string_only=False, insensitive=False) -> Optional[re.Pattern]:
+    """Compile spec to search utf-8 bytes.
+
+    Return None if that could match differently than searching the
+    decoded text: if we ignore case, as text folds more than ascii,
+    or if spec has classes like \\w that are ascii only for bytes,
+    escapes like \\xe9 that mean a byte rather than a character, or
+    escapes like \\u00e9 that only str patterns know.
+
+    """
+    if insensitive:
+        return None
+    if string_only:
+        return re.compile(re.escape(spec).encode("utf-8"))
+    if not spec.isascii():
+        return None
+    try:
+        parsed = sre_parse.parse(spec)
+    except re.error:
+        return None
+    # the flags set with (?i) in spec
+    state = getattr(parsed, "state", None) or parsed.pattern
+    if state.flags & re.IGNORECASE or not bytes_safe(parsed):
+        return None
+    try:
+        return re.compile(spec.encode("utf-8"))
+    except re.error:
+        return None
+
+
+@functools.lru_cache(maxsize=8)
+def file_matcher(spec, string_only=False, insensitive=False) -> Callable:
+    """Return function that tests the file at a path against spec."""
+    pattern = bytes_pattern(spec, string_only, insensitive)
+    if pattern is None:
+        matches = content_matcher(spec, string_only, insensitive)
+
+        def match_text(path):
+            with codecs.open(path, "r", "utf-8") as f:
+                return matches(f.read())
+
+        return match_text
+
+    def match_bytes(path):
+        with open(path, "rb") as f:
+            if not os.fstat(f.fileno()).st_size:
+                # can't map an empty file
+                return pattern.search(b"") is not None
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return pattern.search(mm) is not None
+
+    return match_bytes
+
+
+def search_files(paths, spec, string_only=False, insensitive=False) -> List[str]:
+    """Return those of paths whose content matches spec.
+
+    This runs in worker processes when scanning in parallel.
+
+    """
+    matches = file_matcher(spec, string_only, insensitive)
+    found = list()
+    for path in paths:
+        try:
+            if matches(path):
+                found.append(path)
+        except FileNotFoundError:
+            continue
+    return found
+
+
+def scan_files(
+    paths: List[str], spec, string_only=False, insensitive=False, jobs=1
+) -> Iterator[str]:
+    """Generate those of paths whose content matches spec.
+
+    With more than one job, batches of files are searched by a
+    process pool and matches are generated as batches finish, so not
+    in the order of paths.
+
+    """
+    # fail here rather than in a worker if spec is not valid
+    file_matcher(spec, string_only, insensitive)
+    if not jobs or jobs <= 1 or len(paths) < 2 * SCAN_BATCH:
+        for path in paths:
+            yield from search_files([path], spec, string_only, insensitive)
+        return
+    size = max(1, min(SCAN_BATCH, len(paths) // (4 * jobs)))
+    executor = ProcessPoolExecutor(max_workers=jobs)
+    futures = [
+        executor.submit(
+            search_files, paths[i : i + size], spec, string_only, insensitive
+        )
+        for i in range(0, len(paths), size)
+    ]
+    try:
+        for future in as_completed(futures):
+            yield from future.result()
+    finally:
+        # we might be abandoned before all batches are done
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+
+def match_lines(
+    path: str,
+    spec,
+    string_only=False,
+    insensitive=False,
+    context=0,
+    max_count: Optional[int] = None,
+) -> Iterator[Tuple[int, str, bool]]:
+    """Generate (line number, line, matched) for lines matching spec.
+
+    Lines are matched one at a time, so a regular expression can't
+    match across lines. Up to context lines before and after each
+    match are generated too, with matched False. We stop reading the
+    file once max_count lines have matched and their context is done.
+
+    """
+    matches = content_matcher(spec, string_only, insensitive)
+    before: deque = deque(maxlen=context)
+    after = 0
+    count = 0
+    with codecs.open(path, "r", "utf-8") as f:
+        for number, line in enumerate(f, 1):
+            line = line.rstrip("\r\n")
+            if max_count is not None and count >= max_count:
+                if not after:
+                    return
+                after -= 1
+                yield number, line, False
+                continue
+            if matches(line):
+                yield from before
+                before.clear()
+                yield number, line, True
+                count += 1
+                after = context
+            elif after:
+                after -= 1
+                yield number, line, False
+            else:
+                before.append((number, line, False))
+
+
+def term_filter(word: str, left_bounded: bool, right_bounded: bool) -> Callable:
+    """Return test for index terms that word, as part of a spec, can be in.
+
+    A word in the middle of a spec is a whole term. A word at the start
+    of a spec could be the end of a longer term, at the end of a spec
+    the start of one, and a spec of one word can be anywhere in a term.
+
+    """
+    if left_bounded and right_bounded:
+        return lambda term: term == word
+    if left_bounded:
+        return lambda term: term.startswith(word)
+    if right_bounded:
+        return lambda term: term.endswith(word)
+    return lambda term: word in term
+
+
+class ContentIndex(object):
+    """Base for indexes of document contents.
+
+    data["docs"] has an entry for each indexed document with the digest
+    it was indexed at and the terms it contributed. Subclasses keep
+    their postings in data["terms"].
+
+    An index saved with another version is rebuilt.
+
+    """
+
+    version = 1
+
+    def __init__(self, path: str):
+        self.path = path
+        self.dirty = False
+        self._data: Optional[Dict] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._data is not None
+
+    @property
+    def data(self) -> Dict:
+        if self._data is None:
+            data = read_json(self.path, None, "Rebuilding damaged search index")
+            if data is None or data.get("version", 1) != self.version:
+                self._data = {"docs": dict(), "terms": dict()}
+            else:
+                self._data = self.decode(data)
+        return self._data
+
+    def decode(self, data: Dict) -> Dict:
+        return data
+
+    def encode(self, data: Dict) -> Dict:
+        return data
+
+    def update(self, uid: str, digest: str, content: Callable) -> None:
+        """Index a document unless already indexed with this digest.
+
+        content is called to get the text only if we need it.
+
+        """
+        entry = self.data["docs"].get(uid)
+        if entry and entry["digest"] == digest:
+            return
+        self.remove(uid)
+        doc_terms = self.add_postings(uid, content())
+        self.data["docs"][uid] = {"digest": digest, "terms": sorted(doc_terms)}
+        self.dirty = True
+
+    def add_postings(self, uid: str, content: str) -> Iterable[str]:
+        """Add postings for content; return the terms added."""
+        raise NotImplementedError
+
+    def remove(self, uid: str) -> None:
+        entry = self.data["docs"].pop(uid, None)
+        if entry is None:
+            return
+        for term in entry["terms"]:
+            self.remove_posting(term, uid)
+        self.dirty = True
+
+    def remove_posting(self, term: str, uid: str) -> None:
+        terms = self.data["terms"]
+        postings = terms.get(term, dict())
+        postings.pop(uid, None)
+        if not postings:
+            terms.pop(term, None)
+
+    def uids(self) -> Set[str]:
+        return set(self.data["docs"])
+
+    def save(self) -> None:
+        """Write the index if anything changed."""
+        if not self.dirty:
+            return
+        data = self.encode(self._data)
+        write_json_atomic(self.path, dict(data, version=self.version))
+        self.dirty = False
+
+
+class WordIndex(ContentIndex):
+    """Inverted index of words in documents.
+
+    data["terms"] maps word to uid to positions.
+
+    """
+
+    # words were lowered rather than casefolded in version 1
+    version = 2
+
+    def add_postings(self, uid: str, content: str) -> Iterable[str]:
+        terms = self.data["terms"]
+        doc_terms = set()
+        for position, term in enumerate(tokenize(content)):
+            terms.setdefault(term, dict()).setdefault(uid, list()).append(position)
+            doc_terms.add(term)
+        return doc_terms
+
+    def candidates(self, spec: str) -> Optional[Set[str]]:
+        """Return uids of documents that might contain spec.
+
+        Matching ignores case. Return None if spec has no words, in
+        which case the index is no help.
+
+        """
+        spec = spec.casefold()
+        words = list(TOKEN_RE.finditer(spec))
+        if not words:
+            return None
+        terms = self.data["terms"]
+        positions: Optional[Dict[str, Set[int]]] = None
+        for m in words:
+            matches = term_filter(m.group(), m.start() > 0, m.end() < len(spec))
+            word_positions: Dict[str, Set[int]] = dict()
+            for term in filter(matches, terms):
+                for uid, term_positions in terms[term].items():
+                    word_positions.setdefault(uid, set()).update(term_positions)
+            if positions is None:
+                positions = word_positions
+            else:
+                # words of a spec are in consecutive positions
+                positions = {
+                    uid: {p + 1 for p in doc_positions} & word_positions[uid]
+                    for uid, doc_positions in positions.items()
+                    if uid in word_positions
+                }
+            positions = {uid: p for uid, p in positions.items() if p}
+        return set(positions)
+
+
+class TrigramIndex(ContentIndex):
+    """Index of three character sequences in documents, ignoring case.
+
+    data["terms"] maps trigram to a set of uids, stored as a list.
+
+    """
+
+    def decode(self, data: Dict) -> Dict:
+        data["terms"] = {t: set(uids) for t, uids in data["terms"].items()}
+        return data
+
+    def encode(self, data: Dict) -> Dict:
+        terms = {t: sorted(uids) for t, uids in data["terms"].items()}
+        return {"docs": data["docs"], "terms": terms}
+
+    def add_postings(self, uid: str, content: str) -> Iterable[str]:
+        terms = self.data["terms"]
+        doc_terms = trigrams(content)
+        for term in doc_terms:
+            terms.setdefault(term, set()).add(uid)
+        return doc_terms
+
+    def remove_posting(self, term: str, uid: str) -> None:
+        terms = self.data["terms"]
+        postings = terms.get(term, set())
+        postings.discard(uid)
+        if not postings:
+            terms.pop(term, None)
+
+    def candidates(self, literals: List[str]) -> Optional[Set[str]]:
+        """Return uids of documents that might contain all of literals.
+
+        Return None if the literals are too short to use the index.
+
+        """
+        required = set()
+        for literal in literals:
+            required |= trigrams(literal)
+        if not required:
+            return None
+        terms = self.data["terms"]
+        # start with the rarest trigram
+        result: Optional[Set[str]] = None
+        for term in sorted(required, key=lambda t: len(terms.get(t, ()))):
+            uids = terms.get(term, set())
+            result = set(uids) if result is None else result & uids
+            if not result:
+                break
+        return result
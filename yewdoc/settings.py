@@ -67,35 +67,3 @@ class Preferences:
     def delete_user_pref(self, k):
         new_data = glom.delete(self.data, k, ignore_missing=True)
         write_user_prefs(self.username, new_data)
-
-    def update_recent(self, doc):
-        """Update most recent list.
-
-        Return list of uids.
-
-        """
-
-        list_unparsed = self.get_user_pref("recent_list")
-        if list_unparsed:
-            list_parsed = json.loads(list_unparsed)
-        else:
-            list_parsed = []
-        if doc.uid in list_parsed:
-            list_parsed.remove(doc.uid)  # take it out
-        list_parsed.insert(0, doc.uid)  # make it the first one
-        # now save the new list
-        self.put_user_pref("recent_list", json.dumps(list_parsed))
-
-    def get_recent(self):
-        """Get most recent documents."""
-
-        list_unparsed = self.get_user_pref("recent_list")
-        docs = []
-        if list_unparsed:
-            list_parsed = json.loads(list_unparsed)
-            for uid in list_parsed:
-                d = self.get_doc(uid)
-                if d:
-                    docs.append(d)
-            return docs
-        return []
@@ -1,3 +1,6 @@
+import importlib
+import os
+import re
 import sys
 import difflib
 from typing import List, Optional, Dict, Union
@@ -6,13 +9,17 @@ import click
 
 from .store import YewStore
 from .remote import REMOTES
-from .remote import Remote
 from .utils import (
     is_short_uuid,
     is_uuid,
 )
 from .actions import ACTION_HANDLERS
 from .document import Document
+from .index import title_matcher
+from . import doc_query
+from . import file_system as fs
+from . import profiling
+from . import tag_query
 
 __version__ = "0.2.0"
 __author__ = "Paul Wolf"
@@ -28,38 +35,160 @@ class YewCLI:
 
     def __init__(self, username=None, debug=False):
 
-        self.store = YewStore(username=username)
+        with profiling.phase("store"):
+            self.store = YewStore(username=username)
         if debug:
             print(f"***************** {self.store.username} ************")
         remote_name = self.store.prefs.get_user_pref("location.default.remote_type")
-        if not remote_name:
-            remote_class = Remote
-        else:
-            try:
-                remote_class = REMOTES[remote_name]
-            except KeyError:
-                click.echo(
-                    f"Could not find {remote_name} as a remote type; choices are: {list(REMOTES.keys())}; check settings."
-                )
-                sys.exit(1)
-        self.remote = remote_class(self.store)
+        # the remote's module is imported here, so time finding it too
+        with profiling.phase("remote"):
+            if not remote_name:
+                remote_class = REMOTES["RemoteREST"]
+            else:
+                try:
+                    remote_class = REMOTES[remote_name]
+                except KeyError:
+                    click.echo(
+                        f"Could not find {remote_name} as a remote type; choices are: {list(REMOTES.keys())}; check settings."
+                    )
+                    sys.exit(1)
+            self.remote = remote_class(self.store)
         self.actions = ACTION_HANDLERS
         if debug:
             print(f"***************** {remote_class.__name__} ************")
 
 
-@click.group()
+# modules in yewdoc.cmd; each registers a command named after it,
+# with dashes for underscores
+COMMAND_MODULES = [
+    "api",
+    "apply",
+    "archive",
+    "attach",
+    "authenticate",
+    "browse",
+    "configure",
+    "context",
+    "convert",
+    "cp",
+    "create",
+    "daemon",
+    "decrypt",
+    "delete",
+    "describe",
+    "diff",
+    "edit",
+    "encrypt",
+    "find",
+    "generate_index",
+    "head",
+    "info",
+    "kind",
+    "ls",
+    "path",
+    "ping",
+    "purge",
+    "push",
+    "read",
+    "register",
+    "rename",
+    "rls",
+    "show",
+    "status",
+    "sync",
+    "tag",
+    "tags",
+    "tail",
+    "take",
+    "user_pref",
+    "verify",
+]
+
+
+class LazyGroup(click.Group):
+    """Group that imports a command's module only when it is used.
+
+    The command modules import pypandoc, gnupg, jinja2 and the like,
+    which would otherwise be loaded for every invocation.
+
+    """
+
+    def list_commands(self, ctx):
+        names = {module.replace("_", "-") for module in COMMAND_MODULES}
+        return sorted(names | set(self.commands))
+
+    def get_command(self, ctx, cmd_name):
+        module = cmd_name.replace("-", "_")
+        if cmd_name not in self.commands and module in COMMAND_MODULES:
+            # the module registers its command on cli when imported
+            with profiling.phase("import command"):
+                importlib.import_module(f".cmd.{module}", __package__)
+        return super().get_command(ctx, cmd_name)
+
+    def invoke(self, ctx):
+        if ctx.params.get("profile"):
+            # started here so it sees the command imported
+            path = os.path.join(
+                fs.get_tmp_directory(ctx.params.get("user")), "yd.pstats"
+            )
+            ctx.meta["profiler"] = profiling.Profiler(path)
+        return super().invoke(ctx)
+
+
+@click.group(cls=LazyGroup)
 @click.option("--user", help="User name", required=False)
 @click.option("--debug", "-d", is_flag=True, help="Debug flag", required=False)
+@click.option(
+    "--profile",
+    is_flag=True,
+    required=False,
+    help="Profile the command and show where the time went",
+)
 @click.pass_context
-def cli(ctx, user, debug):
+def cli(ctx, user, debug, profile):
 
-    yew = YewCLI(username=user, debug=debug)
     ctx.ensure_object(dict)
+    # yd daemon passes in the one it keeps
+    yew = ctx.obj.get("YEW") or YewCLI(username=user, debug=debug)
+    profiler = ctx.meta.get("profiler") if profile else None
+
+    def close():
+        # one callback, as click 7 and 8 run them in different orders and
+        # the profile must see the flush
+        try:
+            yew.store.flush()
+        finally:
+            if profiler:
+                profiler.report()
+
+    ctx.call_on_close(close)
     ctx.obj["YEW"] = yew
     ctx.obj["DEBUG"] = debug
 
 
+def parse_tags(ctx, param, value):
+    """Click callback that checks a tag query and passes it on as is."""
+    if value:
+        try:
+            tag_query.parse(value)
+        except tag_query.TagQueryError as e:
+            raise click.BadParameter(str(e))
+    return value
+
+
+TAGS_HELP = "Tags to match, like 'a,b' for either or 'work & !archived'"
+
+
+def parse_query(ctx, param, value):
+    """Click callback that compiles a metadata query."""
+    if not value:
+        return None
+    try:
+        return doc_query.MetadataQuery(value)
+    except doc_query.QueryError as e:
+        raise click.BadParameter(str(e))
+
+
 def parse_ranges(s):
     """Parse s as a list of range specs."""
     range_list = []  # return value is a list of doc indexes
@@ -79,32 +208,80 @@ def parse_ranges(s):
     return range_list
 
 
-def document_menu(docs, multiple=False) -> List[Document]:
-    """Show list of docs. Return selection.
+# documents per page of a menu
+MENU_SIZE = 20
+
+MENU_HELP = (
+    "Enter a number{ranges}, text to narrow the list, "
+    "return or > for the next page, < for the previous one, "
+    "* to list all again or q to quit"
+)
+
+
+def filter_docs(docs, text) -> List[Document]:
+    """Return docs whose titles match text, as a title search would."""
+    matcher = title_matcher(text, False)
+    return [doc for doc in docs if matcher(doc.name)]
+
+
+def document_menu(docs, multiple=False, page_size=MENU_SIZE) -> List[Document]:
+    """Show list of docs a page at a time. Return selection.
 
     Multiple means use can provide a range otherwise,
     a list with a single doc is returned.
+
+    Typing text narrows the list to matching titles; this filters the
+    docs we already have so it doesn't go back to the store.
+    Numbers index the narrowed list.
     """
     if not len(docs):
         return list()
 
-    for index, doc in enumerate(docs):
-        click.echo(f"{index}) {doc.name} ({doc.short_uid()})")
-    if multiple:
-        v = click.prompt("Select document. You can provide ranges.")
-        index_list = parse_ranges(v)
-        doc_list = []
-        for i in index_list:
-            if i in range(len(docs)):
-                doc_list.append(docs[i])
-        return doc_list  # returning a list of docs!!
-    else:
-        v = click.prompt("Select document", type=int)
-        if v not in range(len(docs)):
-            print("Choice not in range")
+    shown = docs
+    page = 0
+    help_text = MENU_HELP.format(ranges=" or ranges like 1,3-5" if multiple else "")
+    while True:
+        pages = (len(shown) + page_size - 1) // page_size
+        first = page * page_size
+        for index, doc in enumerate(shown[first : first + page_size], first):
+            click.echo(f"{index}) {doc.name} ({doc.short_uid()})")
+        if pages > 1:
+            click.echo(f"page {page + 1} of {pages}, {len(shown)} documents")
+        v = click.prompt(
+            "Select document. ? for help", default="", show_default=False
+        ).strip()
+        if v == "?":
+            click.echo(help_text)
+        elif v in ("", ">"):
+            page = min(page + 1, pages - 1)
+        elif v == "<":
+            page = max(page - 1, 0)
+        elif v.lower() == "q":
             return list()
-
-    return [docs[v]]
+        elif v == "*":
+            shown, page = docs, 0
+        elif re.match(r"^[\d,\s-]+$", v):
+            v = v.replace(" ", "")
+            if not re.match(r"^\d+(-\d+)?(,\d+(-\d+)?)*$", v):
+                click.echo("Choice not in range")
+                continue
+            index_list = parse_ranges(v)
+            if not multiple:
+                index_list = index_list[:1]
+            doc_list = [shown[i] for i in index_list if i in range(len(shown))]
+            if doc_list:
+                return doc_list
+            click.echo("Choice not in range")
+        else:
+            try:
+                narrowed = filter_docs(shown, v)
+            except re.error as e:
+                click.echo(f"Can't use {v} as a title pattern: {e}")
+                continue
+            if narrowed:
+                shown, page = narrowed, 0
+            else:
+                click.echo(f"No titles match {v}")
 
 
 def get_document_selection(
@@ -114,10 +291,13 @@ def get_document_selection(
 
     name (str): a title or partial title to use as search
     list_docs (bool): a flag to list documents are not.
+    tags (str): a tag query like "work & !archived", see tag_query
     multiple (bool): allow range of integers for a list selection
 
     If there is no name, show recent list.
-    otherwise, show all docs
+    otherwise, show all docs, those with titles most like name first.
+    A list is shown MENU_SIZE docs at a time; if no title matches
+    name, it shows the most similar titles instead.
 
     We let user specify if a list of docs should be returned.
     In that case, the return value's type is a list.
@@ -132,15 +312,21 @@ def get_document_selection(
         return [yew.store.get_short(name)]
 
     if not name and not list_docs and not tags:
-        docs = yew.store.get_recent(yew.store.username)
+        docs = yew.store.get_recent()
         return document_menu(docs, multiple)
     elif list_docs:
         docs = yew.store.get_docs(name_frag=name, tags=tags)
+        if name and docs:
+            docs = yew.store.rank_docs(name, docs)
+        elif name and not tags:
+            # only suggestions, so always let the user choose, or not
+            return document_menu(yew.store.rank_docs(name, limit=MENU_SIZE), multiple)
         if len(docs) == 1:
             return docs
         return document_menu(docs, multiple)
     elif name and not list_docs:
-        return yew.store.get_docs(name_frag=name, tags=tags)
+        docs = yew.store.get_docs(name_frag=name, tags=tags)
+        return yew.store.rank_docs(name, docs)
     elif name or tags:
         docs = yew.store.get_docs(name_frag=name, tags=tags)
         if len(docs) == 1:
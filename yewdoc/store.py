@@ -10,7 +10,11 @@ The index can be generated from the document directory.
 
 """
 
-from typing import List, Optional, Dict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from itertools import chain, repeat
+from typing import Iterable, Iterator, List, Optional, Dict, Set, Tuple
+import codecs
 import datetime
 import json
 import os
@@ -23,9 +27,6 @@ import click
 import configparser
 
 
-from requests.exceptions import ConnectionError
-
-
 from .utils import (
     tar_directory,
     delete_directory,
@@ -39,41 +40,156 @@ from .utils import (
     modification_date,
     slugify,
     to_utc,
+    write_json_atomic,
 )
 
-from .document import Document
+from .digest_cache import DigestCache
+from .digest_cache import stat_signature
+from .document import Document, read_tag_index, write_tag_index
+from .recent import RECENT_SIZE, RecentList
+from .index import ORDER_COLUMNS, ColumnarIndex, DocIndex, SqliteIndex, match
+from .search import (
+    ContentIndex,
+    TrigramIndex,
+    WordIndex,
+    is_literal,
+    match_lines,
+    regex_literals,
+    scan_files,
+)
 from .tag import Tag, TagDoc
+from . import doc_query
 from . import file_system as fs
+from . import profiling
+from . import tag_query
 from .settings import Preferences
 from . import utils
 
 
+# compact the journal into index.json when it grows beyond this
+JOURNAL_MAX_BYTES = 1024 * 1024
+
+# kept in index records so listings don't need to stat files
+STAT_FIELDS = ["size", "mtime", "link"]
+
+# below this many documents a process pool costs more than it saves
+PARALLEL_MIN_DOCS = 256
+
+
 def read_document_index(user_directory) -> List:
-    """Read document index into list."""
+    """Read document index into list.
+
+    Changes in the journal not yet compacted into index.json are
+    replayed on top of it.
+
+    """
 
     path = os.path.join(user_directory, "index.json")
+    records = list()
+    if os.path.exists(path):
+        try:
+            with open(path) as f:
+                records = json.load(f)
+        except json.decoder.JSONDecodeError:
+            print(f"Could not get document index. Check file: {path}")
+            return None
+    journal = read_index_journal(user_directory)
+    if not journal:
+        return records
+    index = {data["uid"]: data for data in records}
+    for entry in journal:
+        if entry["op"] == "put":
+            index[entry["data"]["uid"]] = entry["data"]
+        elif entry["op"] == "remove":
+            index.pop(entry["uid"], None)
+    return list(index.values())
+
+
+def read_index_journal(user_directory) -> List[Dict]:
+    """Read index mutations, one json object per line.
+
+    A line that is not valid json is the result of an interrupted write
+    and is skipped.
+
+    """
+    path = os.path.join(user_directory, "index.journal")
     if not os.path.exists(path):
         return list()
-    try:
-        with open(path) as f:
-            return json.load(f)
-    except json.decoder.JSONDecodeError:
-        print(f"Could not get document index. Check file: {path}")
+    entries = list()
+    with open(path) as f:
+        for line in f:
+            try:
+                entries.append(json.loads(line))
+            except json.decoder.JSONDecodeError:
+                print(f"Skipping damaged index journal entry in: {path}")
+    return entries
+
+
+def append_index_journal(user_directory, entries: List[Dict]) -> int:
+    """Append index mutations to the journal and return its size in bytes."""
+    path = os.path.join(user_directory, "index.journal")
+    with open(path, "at") as f:
+        f.write("".join(json.dumps(entry) + "\n" for entry in entries))
+        return f.tell()
+
+
+def write_index_json(user_directory, records: List[Dict]) -> None:
+    """Replace index.json with records and empty the journal."""
+    path = os.path.join(user_directory, "index.json")
+    write_json_atomic(path, records, indent=4)
+    journal_path = os.path.join(user_directory, "index.journal")
+    if os.path.exists(journal_path):
+        os.unlink(journal_path)
+
+
+def doc_from_data(store, data):
+    doc = Document(
+        store, data["uid"], data["title"], data["kind"], data.get("encrypt") or 0
+    )
+    doc.index_data = data
+    return doc
 
 
-def match(frag, s, exact):
-    """Match a search string frag with string s.
+def is_document_file(name) -> bool:
+    """Whether name in a document directory is the document itself.
 
-    This is how we match document titles/names.
+    Skip editor backup files and our own files like __tags.json.
 
     """
-    if not exact:
-        return re.search(frag, s, re.IGNORECASE)
-    return re.match(f"^{frag}$", s)
+    return not (name.startswith(("~", "#", "__")) or name.endswith(("~", "#")))
 
 
-def doc_from_data(store, data):
-    return Document(store, data["uid"], data["title"], data["kind"])
+def read_document_directory(path, digest_method) -> Optional[Tuple[Dict, List]]:
+    """Build the index record for the document directory at path.
+
+    Return the record and the stat signature of the document file.
+    This runs in worker processes when regenerating the index.
+
+    """
+    with os.scandir(path) as entries:
+        for f in entries:
+            if f.is_file() and is_document_file(f.name):
+                break
+        else:
+            return None
+    with codecs.open(f.path, "r", "utf-8") as fp:
+        content = fp.read()
+    stat = os.stat(f.path)
+    dir_stat = os.stat(path)
+    base, ext = os.path.splitext(f.name)
+    data = {
+        "uid": os.path.basename(path),
+        "title": base,
+        "kind": ext[1:],
+        "digest": digest_method(content),
+        "tags": read_tag_index(path),
+        "encrypt": 1 if content.startswith("-----BEGIN PGP MESSAGE-----") else 0,
+        "size": stat.st_size,
+        "mtime": stat.st_mtime,
+        "link": f.is_symlink(),
+        "dir_mtime": dir_stat.st_mtime,
+    }
+    return data, stat_signature(stat)
 
 
 def touch(path):
@@ -92,20 +208,290 @@ class YewStore(object):
         """Init data required to find things on this local disk."""
         self.username = fs.get_username(username)
         self.yew_dir = fs.get_user_directory(self.username)
-        self.prefs = Preferences(self.username)
+        with profiling.phase("prefs"):
+            self.prefs = Preferences(self.username)
         self.offline = False
         self.location = "default"
-        self.index = read_document_index(self.yew_dir)
+        self.index_engine = self.prefs.get_user_pref("index_engine", "json")
+        with profiling.phase("index"):
+            self.doc_index = self.open_index()
+        self.digest_cache = DigestCache(os.path.join(self.yew_dir, "digests.json"))
+        self.word_index = WordIndex(os.path.join(self.yew_dir, "word_index.json"))
+        self.trigram_index = TrigramIndex(
+            os.path.join(self.yew_dir, "trigram_index.json")
+        )
+        self.search_indexes: List[ContentIndex] = [self.word_index, self.trigram_index]
+        self.recent = self.open_recent()
+
+        # writes held back until the outermost batch() ends
+        self.batch_depth = 0
+        self.pending_tags: Dict[str, List[str]] = dict()
+        self.pending_deleted: List[str] = list()
 
         # this gets injected later by remote, but let's use a default
         self.digest_method = utils.get_sha_digest
 
+    @property
+    def index_path(self) -> str:
+        """The file the index is kept in."""
+        name = "index.sqlite3" if self.index_engine == "sqlite" else "index.json"
+        return os.path.join(self.yew_dir, name)
+
+    def open_index(self):
+        """Open the index engine selected by the index_engine user pref.
+
+        The json and columnar engines keep the index in index.json, the
+        sqlite engine in a database. The index_storage user pref records
+        which was used last, so changing engine carries the index over.
+
+        """
+        storage = "sqlite" if self.index_engine == "sqlite" else "json"
+        previous = self.prefs.get_user_pref("index_storage")
+        sqlite_path = os.path.join(self.yew_dir, "index.sqlite3")
+        if self.index_engine == "sqlite":
+            doc_index = SqliteIndex(sqlite_path)
+            if previous not in (None, storage) or not len(doc_index):
+                # first use, or index.json was used since, so import it
+                records = read_document_index(self.yew_dir)
+                if records is not None:
+                    for data in records:
+                        data.update(doc_from_data(self, data).get_stat_data())
+                    doc_index.replace(records)
+                    doc_index.commit()
+        else:
+            if previous == "sqlite" and os.path.exists(sqlite_path):
+                # the database was used since, so export it
+                sqlite_index = SqliteIndex(sqlite_path)
+                write_index_json(self.yew_dir, sqlite_index.to_list())
+                sqlite_index.conn.close()
+            records = read_document_index(self.yew_dir)
+            if self.index_engine == "columnar":
+                doc_index = ColumnarIndex(records)
+            else:
+                doc_index = DocIndex(records)
+        if previous != storage:
+            self.prefs.put_user_pref("index_storage", storage)
+        return doc_index
+
+    def open_recent(self) -> RecentList:
+        """Open the recent list, sized by the recent_size user pref."""
+        try:
+            size = int(self.prefs.get_user_pref("recent_size", RECENT_SIZE))
+        except ValueError:
+            size = RECENT_SIZE
+        recent = RecentList(os.path.join(self.yew_dir, "recent.json"), size)
+        # the list used to be kept in settings.json
+        old_list = self.prefs.get_user_pref("recent_list")
+        if old_list:
+            if not recent.exists():
+                recent.extend(json.loads(old_list))
+            self.prefs.delete_user_pref("recent_list")
+        return recent
+
+    def update_recent(self, doc: Document) -> None:
+        """Make doc the most recently used document."""
+        self.recent.touch(doc.uid)
+
+    def get_recent(self) -> List[Document]:
+        """Return recently used documents, most recent first."""
+        docs = list()
+        for uid in self.recent.uids:
+            data = self.doc_index.get(uid)
+            if data is not None:
+                docs.append(doc_from_data(self, data))
+        return docs
+
+    def get_digest(self, doc: Document) -> str:
+        """Digest of doc with the current digest method.
+
+        Only reads the document if it changed since we last saw it.
+
+        """
+        return self.digest_cache.get(
+            doc.uid, doc.path, self.digest_method, doc.get_content
+        )
+
+    def get_stat_data(self, doc: Document) -> Dict:
+        """Size, mtime and link flag of doc as recorded in the index.
+
+        Records written before we kept these are updated from disk.
+
+        """
+        data = doc.index_data
+        if data is None or any(data.get(k) is None for k in STAT_FIELDS):
+            stat_data = doc.get_stat_data()
+            if data is None or doc.uid not in self.doc_index:
+                return stat_data
+            data.update(stat_data)
+            self.doc_index.put(data)
+        return {k: data[k] for k in STAT_FIELDS}
+
+    def fill_stat_data(self, fields: Iterable[str]) -> None:
+        """Read fields from disk for records written before we kept them."""
+        for data in self.doc_index.lacking(fields):
+            self.get_stat_data(doc_from_data(self, data))
+
+    def refresh_stat_data(self, docs: List[Document]) -> None:
+        """Update size, mtime and link flag in the index from disk."""
+        for doc in docs:
+            stat_data = doc.get_stat_data()
+            data = doc.index_data
+            if data is None or all(data.get(k) == v for k, v in stat_data.items()):
+                continue
+            data.update(stat_data)
+            self.doc_index.put(data)
+        self.write_index()
+
+    def flush(self) -> None:
+        """Persist anything we hold in memory."""
+        with profiling.phase("flush"):
+            self.write_index()
+            self.digest_cache.save()
+            self.recent.save()
+            for search_index in self.search_indexes:
+                search_index.save()
+
+    def refresh_search_index(self, search_index: ContentIndex, docs=None) -> None:
+        """Index contents of docs that changed since they were last indexed."""
+        if docs is None:
+            docs = self.get_docs()
+        uids = set()
+        for doc in docs:
+            try:
+                search_index.update(doc.uid, doc.digest, doc.get_content)
+            except FileNotFoundError:
+                continue
+            uids.add(doc.uid)
+        for uid in search_index.uids() - uids:
+            search_index.remove(uid)
+
+    def search_candidates(
+        self, spec: str, string_only=False, docs=None
+    ) -> Optional[Set[str]]:
+        """Return uids of documents that might match spec.
+
+        Plain strings are looked up in the word index, regular
+        expressions in the trigram index. Return None if neither index
+        can narrow down the search.
+
+        """
+        if docs is None:
+            docs = self.get_docs()
+        if string_only or is_literal(spec):
+            self.refresh_search_index(self.word_index, docs)
+            candidates = self.word_index.candidates(spec)
+            if candidates is not None:
+                return candidates
+            literals = [spec]
+        else:
+            literals = regex_literals(spec)
+        if not literals:
+            return None
+        self.refresh_search_index(self.trigram_index, docs)
+        return self.trigram_index.candidates(literals)
+
+    def candidate_docs(self, spec: str, string_only=False) -> List[Document]:
+        """Documents the search indexes can't rule out matching spec."""
+        docs = self.get_docs()
+        candidates = self.search_candidates(spec, string_only, docs)
+        if candidates is not None:
+            docs = [doc for doc in docs if doc.uid in candidates]
+        return docs
+
+    def find_docs(
+        self, spec: str, string_only=False, insensitive=False, jobs=None
+    ) -> Iterator[Document]:
+        """Generate documents with content matching spec.
+
+        spec is a regular expression unless string_only is set.
+        Only documents the search indexes can't rule out are read.
+        With jobs > 1 they are scanned by that many processes and
+        documents are generated as they are found, in no particular
+        order.
+
+        """
+        by_path = {doc.path: doc for doc in self.candidate_docs(spec, string_only)}
+        for path in scan_files(list(by_path), spec, string_only, insensitive, jobs):
+            yield by_path[path]
+
+    def find_lines(
+        self,
+        spec: str,
+        string_only=False,
+        insensitive=False,
+        context=0,
+        max_count: Optional[int] = None,
+        jobs=None,
+    ) -> Iterator[Tuple[Document, Iterator]]:
+        """Generate documents with lines matching spec.
+
+        Each document comes with a generator of its matching lines, as
+        from search.match_lines(). A document is only read as far as
+        that generator is consumed. With jobs > 1 documents are first
+        scanned in parallel as for find_docs().
+
+        """
+        if jobs and jobs > 1:
+            docs = self.find_docs(spec, string_only, insensitive, jobs)
+        else:
+            docs = self.candidate_docs(spec, string_only)
+        for doc in docs:
+            try:
+                lines = match_lines(
+                    doc.path, spec, string_only, insensitive, context, max_count
+                )
+                first = next(lines, None)
+            except FileNotFoundError:
+                continue
+            if first is None:
+                # matched across lines, or changed since we looked
+                continue
+            yield doc, chain([first], lines)
+
     def get_gnupg_exists(self):
         """Retro fit this."""
         fs.get_gnupg_exists()
 
+    @property
+    def index(self) -> List[Dict]:
+        """List of index records, as persisted in index.json."""
+        return self.doc_index.to_list()
+
+    def get_docs_by_title(self, title: str) -> List[Document]:
+        """Return docs with exactly this title, by hashed lookup."""
+        return [doc_from_data(self, data) for data in self.doc_index.find_title(title)]
+
+    def rank_docs(
+        self, name: str, docs: Optional[List[Document]] = None, limit=None
+    ) -> List[Document]:
+        """Return docs ordered by how similar their titles are to name.
+
+        Without docs, return the limit best of all docs whose titles
+        have anything in common with name. With docs, those without
+        anything in common come last, in their original order.
+
+        """
+        fuzzy = self.doc_index.fuzzy_titles()
+        if docs is None:
+            uids = fuzzy.search(name, limit)
+            return [doc_from_data(self, self.doc_index.get(uid)) for uid in uids]
+        by_uid = {doc.uid: doc for doc in docs}
+        ranked = [by_uid[uid] for uid in fuzzy.search(name, limit, set(by_uid))]
+        if limit is None or len(ranked) < limit:
+            seen = {doc.uid for doc in ranked}
+            ranked.extend(doc for doc in docs if doc.uid not in seen)
+        return ranked[:limit]
+
     def get_counts(self):
-        return len(self.index)
+        return len(self.doc_index)
+
+    def get_tag_counts(self) -> Dict[str, int]:
+        """Return number of docs for each tag."""
+        return self.doc_index.tag_counts()
+
+    def get_tagged_count(self) -> int:
+        """Return number of docs with any tag."""
+        return self.doc_index.tagged_count()
 
     def get_or_create_tag(self, name):
         """Create a new tag. Make sure it is unique."""
@@ -148,6 +534,63 @@ class YewStore(object):
 
         return None
 
+    @contextmanager
+    def batch(self) -> Iterator["YewStore"]:
+        """Hold back index, deleted index and tag file writes until the end.
+
+        Commands changing many documents use this so each file is written
+        once, rather than once per document. Nested batches are written
+        when the outermost one ends. That happens even if the block
+        raises, since the documents on disk were changed as far as it got.
+
+        """
+        self.batch_depth += 1
+        try:
+            yield self
+        finally:
+            self.batch_depth -= 1
+            if not self.batch_depth:
+                self.write_batch()
+
+    def write_batch(self) -> None:
+        """Write everything held back by batch()."""
+        pending_tags, self.pending_tags = self.pending_tags, dict()
+        for directory_path, tag_index in pending_tags.items():
+            write_tag_index(directory_path, tag_index)
+            data = self.doc_index.get(os.path.basename(directory_path))
+            if data is not None:
+                # replacing __tags.json changed the directory, see update_doc_data
+                data["dir_mtime"] = os.stat(directory_path).st_mtime
+                self.doc_index.put(data)
+        self.write_index()
+        self.recent.save()
+        if self.pending_deleted:
+            deleted_index = self.get_deleted_index()
+            deleted_index.extend(self.pending_deleted)
+            self.pending_deleted = list()
+            self.write_deleted_index(deleted_index)
+
+    def read_tag_index(self, directory_path: str) -> List[str]:
+        """Return tags of the document in directory_path, as last written."""
+        if directory_path in self.pending_tags:
+            return list(self.pending_tags[directory_path])
+        return read_tag_index(directory_path)
+
+    def write_tag_index(self, directory_path: str, tag_index: List[str]) -> None:
+        if self.batch_depth:
+            self.pending_tags[directory_path] = list(tag_index)
+        else:
+            write_tag_index(directory_path, tag_index)
+
+    def mark_deleted(self, uid: str) -> None:
+        """Remember we deleted uid, so sync doesn't bring it back."""
+        if self.batch_depth:
+            self.pending_deleted.append(uid)
+        else:
+            deleted_index = self.get_deleted_index()
+            deleted_index.append(uid)
+            self.write_deleted_index(deleted_index)
+
     def delete_document(self, doc: Document) -> None:
         """Delete a document and its associated entities."""
 
@@ -165,15 +608,21 @@ class YewStore(object):
 
         if os.path.exists(path):
             shutil.rmtree(path)
+        self.pending_tags.pop(path, None)
 
         # remove from index
-        self.index = list(filter(lambda d: d["uid"] != doc.uid, self.index))
+        self.doc_index.remove(uid)
+        self.digest_cache.remove(uid)
+        self.recent.remove(uid)
+        if not self.batch_depth:
+            self.recent.save()
+        for search_index in self.search_indexes:
+            if search_index.loaded:
+                search_index.remove(uid)
         self.write_index()
 
         # remember we don't want this anymore
-        deleted_index = self.get_deleted_index()
-        deleted_index.append(uid)
-        self.write_deleted_index(deleted_index)
+        self.mark_deleted(uid)
 
     def change_doc_kind(self, doc, new_kind):
         """Change type of document.
@@ -199,15 +648,38 @@ class YewStore(object):
 
     def get_doc(self, uid):
         """Get a doc or throw exception."""
-        return doc_from_data(
-            self, list(filter(lambda d: d["uid"] == uid, self.index))[0]
-        )
+        data = self.doc_index.get(uid)
+        if data is None:
+            raise KeyError(f"Document not in index: {uid}")
+        return doc_from_data(self, data)
 
     def write_index(self) -> None:
-        """Write list of doc dicts."""
-        path = os.path.join(self.yew_dir, "index.json")
-        with open(path, "wt") as f:
-            f.write(json.dumps(self.index, indent=4))
+        """Persist changes to the index.
+
+        Changes are appended to the journal; index.json is only rewritten
+        when the journal gets large. In a batch(), nothing is written
+        until it ends.
+
+        """
+        if self.batch_depth:
+            return
+        if self.index_engine == "sqlite":
+            self.doc_index.commit()
+            return
+        if not self.doc_index.pending:
+            return
+        journal_size = append_index_journal(self.yew_dir, self.doc_index.pending)
+        self.doc_index.pending.clear()
+        if journal_size > JOURNAL_MAX_BYTES:
+            self.compact_index()
+
+    def compact_index(self) -> None:
+        """Write list of doc dicts to index.json and empty the journal."""
+        if self.index_engine == "sqlite":
+            self.doc_index.commit()
+            return
+        write_index_json(self.yew_dir, self.doc_index.to_list())
+        self.doc_index.pending.clear()
 
     def get_deleted_index(self) -> List:
         """Read deleted document index into list."""
@@ -223,39 +695,82 @@ class YewStore(object):
     def write_deleted_index(self, deleted_index) -> None:
         """Write list of deleted uids."""
         path = os.path.join(self.yew_dir, "deleted_index.json")
-        with open(path, "wt") as f:
-            f.write(json.dumps(deleted_index, indent=4))
+        write_json_atomic(path, deleted_index, indent=4)
 
     def get_docs(
         self,
         name_frag: Optional[str] = None,
-        tags: Optional[List] = None,
+        tags=None,
         exact=False,
         encrypted=False,
+        order_by: Optional[str] = None,
+        descending=False,
+        query=None,
     ) -> List[Document]:
         """Get all docs using the index.
 
         Does not get remote.
 
-        """
-        if not name_frag and not tags:
-            return [doc_from_data(self, data) for data in self.index]
+        tags is a list of tags, any of which a doc must have, or a tag
+        query like "work & !archived", see tag_query.
+
+        query is a metadata query like "kind:md size>10k updated<30d",
+        see doc_query. It is evaluated on the index alone.
 
+        order_by can be "updated", "size" or "title"; otherwise docs are
+        in index order.
+
+        """
+        query = doc_query.as_query(query)
+        if query:
+            fields = {c[0] for c in query.conditions if c[0] in STAT_FIELDS}
+            if fields:
+                # records from before we kept stat data would never match
+                self.fill_stat_data(fields)
+        if self.index_engine == "sqlite":
+            records = self.doc_index.select(
+                name_frag,
+                tags,
+                exact,
+                order_by=order_by,
+                descending=descending,
+                query=query,
+            )
+            return [doc_from_data(self, data) for data in records]
+
+        records = self._get_records(name_frag, tags, exact, query)
+        if order_by:
+            field = ORDER_COLUMNS.get(order_by, order_by)
+            if field in STAT_FIELDS:
+                for data in records:
+                    if field not in data:
+                        # from before we kept stat data
+                        self.get_stat_data(doc_from_data(self, data))
+            records = self.doc_index.sort_records(records, field, descending)
+        return [doc_from_data(self, data) for data in records]
+
+    def _get_records(self, name_frag, tags, exact, query=None) -> List[Dict]:
+        """Filter the in-memory index."""
+        if not name_frag and not tags and not query:
+            return self.doc_index.to_list()
+
+        tags = tag_query.as_query(tags) if tags else None
+        if query and query.tags:
+            tags = query.tags if tags is None else ("and", [tags, query.tags])
+        matching_docs: Iterable[Dict] = self.doc_index
+        if tags:
+            matching_docs = self.doc_index.query_tags(tags)
         if name_frag:
-            matching_docs = filter(
-                lambda doc: match(name_frag, doc["title"], exact), self.index
+            matching_docs = self.doc_index.match_titles(
+                name_frag,
+                exact,
+                None if matching_docs is self.doc_index else matching_docs,
             )
-        else:
-            matching_docs = self.index
-        docs = list()
-        for data in matching_docs:
-            if tags:
-                doc_tags = data.get("tags", [])
-                if not bool(set(doc_tags) & set(tags)):
-                    continue
-
-            docs.append(doc_from_data(self, data))
-        return docs
+        if query and query.conditions:
+            if matching_docs is self.doc_index:
+                return self.doc_index.match_query(query)
+            return self.doc_index.match_query(query, matching_docs)
+        return list(matching_docs)
 
     def verify_docs(self, prune=False) -> List:
         """Check that docs in the index exist on disk.
@@ -269,60 +784,103 @@ class YewStore(object):
                 print(f"Does not exist: {doc.uid} {doc.name}")
                 missing_uids.append(doc.uid)
         if prune:
-            self.index = list(
-                filter(lambda d: d["uid"] not in missing_uids, self.index)
-            )
+            for uid in missing_uids:
+                self.doc_index.remove(uid)
             self.write_index()
         return missing_uids
 
-    def generate_doc_data(self, write=False):
+    def generate_doc_data(self, write=False, jobs=None):
         """This generates the index data by reading
         the directory of files for the given user name.
         In case the index.json is corrupted or missing.
+
+        Documents are read and hashed by a pool of jobs processes,
+        defaulting to one per cpu.
         """
-        data = list()
         base_path = os.path.join(self.yew_dir, self.location)
-        for uid_dir in os.scandir(base_path):
-            path = os.path.join(base_path, uid_dir.name)
-            for f in os.scandir(path):
-                if f.is_file():
-                    if not (
-                        f.name.startswith(
-                            (
-                                "~",
-                                "#",
-                            )
-                        )
-                        or f.name.endswith(
-                            (
-                                "~",
-                                "#",
-                            )
-                        )
-                        or f.name.startswith("__")
-                    ):
-                        file_path = os.path.join(path, f.name)
-                        with open(file_path, "rt") as fp:
-                            digest = get_sha_digest(fp.read())
-                        base, ext = os.path.splitext(f.name)
-                        doc = self.get_doc(uid_dir.name)
-                        data.append(
-                            {
-                                "uid": uid_dir.name,
-                                "title": base,
-                                "kind": ext[1:],
-                                "digest": digest,
-                                "tags": doc.get_tag_index(),
-                            }
-                        )
-                        break
+        paths = list()
+        if os.path.exists(base_path):
+            paths = [entry.path for entry in os.scandir(base_path) if entry.is_dir()]
+        data = list(self.read_document_directories(paths, jobs))
 
         if write:
-            path = os.path.join(self.yew_dir, "index.json")
-            with open(path, "wt") as f:
-                f.write(json.dumps(data, indent=4))
+            self.doc_index.replace(data)
+            self.compact_index()
         return data
 
+    def update_doc_data(self, jobs=None) -> Dict[str, int]:
+        """Bring the index up to date with the document directory.
+
+        Like generate_doc_data but only documents whose directory or
+        file changed since they were indexed are read again. Return
+        counts of what changed.
+
+        """
+        counts = {"checked": 0, "added": 0, "updated": 0, "removed": 0}
+        base_path = os.path.join(self.yew_dir, self.location)
+        changed = list()
+        seen = set()
+        entries = os.scandir(base_path) if os.path.exists(base_path) else list()
+        for entry in entries:
+            if not entry.is_dir():
+                continue
+            counts["checked"] += 1
+            seen.add(entry.name)
+            data = self.doc_index.get(entry.name)
+            if data is None:
+                changed.append(entry.path)
+                continue
+            if data.get("dir_mtime") != entry.stat().st_mtime:
+                # files in the directory were added, removed or renamed
+                changed.append(entry.path)
+                continue
+            stat_data = doc_from_data(self, data).get_stat_data()
+            if any(data.get(k) != v for k, v in stat_data.items()):
+                changed.append(entry.path)
+
+        read = set()
+        for record in self.read_document_directories(changed, jobs):
+            read.add(record["uid"])
+            counts["updated" if record["uid"] in self.doc_index else "added"] += 1
+            self.doc_index.put(record)
+        # a directory without a document file is not a document
+        seen -= {os.path.basename(path) for path in changed} - read
+        for data in self.doc_index.to_list():
+            if data["uid"] not in seen:
+                counts["removed"] += 1
+                self.doc_index.remove(data["uid"])
+                self.digest_cache.remove(data["uid"])
+        self.write_index()
+        return counts
+
+    def read_document_directories(self, paths: List[str], jobs=None):
+        """Generate index records for the document directories in paths."""
+        executor = None
+        jobs = jobs or os.cpu_count() or 1
+        if jobs > 1 and len(paths) >= PARALLEL_MIN_DOCS:
+            executor = ProcessPoolExecutor(max_workers=jobs)
+            chunksize = max(1, len(paths) // (4 * jobs))
+            results = executor.map(
+                read_document_directory,
+                paths,
+                repeat(self.digest_method),
+                chunksize=chunksize,
+            )
+        else:
+            results = map(read_document_directory, paths, repeat(self.digest_method))
+        try:
+            for result in results:
+                if result is None:
+                    continue
+                record, signature = result
+                self.digest_cache.put(
+                    record["uid"], signature, self.digest_method, record["digest"]
+                )
+                yield record
+        finally:
+            if executor:
+                executor.shutdown()
+
     def generate_archive(self) -> str:
         """Create archive file in current directory of all docs."""
         archive_file_name = f"yew_{self.username}-{datetime.datetime.now().replace(microsecond=0).isoformat()}.tgz"
@@ -336,17 +894,13 @@ class YewStore(object):
         But we handle the case where it is in the index.
 
         """
-        try:
+        if uid in self.doc_index:
             doc = self.get_doc(uid)
             self.reindex_doc(doc)
-        except Exception:
+        else:
             # we expect to be here
-            data = dict()
-            data["uid"] = uid
-            data["title"] = name
-            data["kind"] = kind
-            doc = doc_from_data(self, data)
-            self.index.append(doc.serialize(no_content=True))
+            doc = Document(self, uid, name, kind)
+            doc.index_data = self.doc_index.put(doc.get_index_data())
             self.write_index()
 
         return doc
@@ -356,15 +910,13 @@ class YewStore(object):
 
         The doc object has new information not yet in the index.
         """
-        for d in self.index:
-            if d.get("uid") == doc.uid:
-                d["title"] = doc.name
-                d["kind"] = doc.kind
-                d["digest"] = doc.digest
-                d["tags"] = doc.get_tag_index()
-                if write_index_flag:
-                    self.write_index()
-                break
+        if doc.uid in self.doc_index:
+            doc.index_data = self.doc_index.put(doc.get_index_data())
+            for search_index in self.search_indexes:
+                if search_index.loaded:
+                    search_index.update(doc.uid, doc.digest, doc.get_content)
+            if write_index_flag:
+                self.write_index()
 
         return doc
 
@@ -372,10 +924,10 @@ class YewStore(object):
         """Get document but with abbreviated uid."""
         if not is_short_uuid(s):
             raise Exception("Not a valid short uid.")
-        for d in self.index:
-            if d.get("uid").startswith(s):
-                return self.get_doc(d.get("uid"))
-        return None
+        data = self.doc_index.find_short(s.lower())
+        if data is None:
+            return None
+        return doc_from_data(self, data)
 
     def create_document(self, name, kind, content=None, symlink_source_path=None):
         """Create a new document.
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""
+Boolean tag queries.
+
+A query combines tags with ``&`` (and), ``|`` or ``,`` (or) and ``!``
+(not), grouped with parentheses:
+
+    work & !archived
+    (draft | review), urgent
+
+``!`` binds tightest, then ``&``, then ``|`` and ``,``. A plain list of
+tags, as in ``a,b``, matches documents with any of them. Tag names with
+operators in them are quoted with ``"`` or ``'``:
+
+    "r&d" | 'to do (later)'
+
+Queries parse to nested tuples:
+
+    ("tag", name)
+    ("not", node)
+    ("and", [node, ...])
+    ("or", [node, ...])
+
+DocIndex evaluates them over bitmaps, SqliteIndex translates them to
+SQL.
+
+"""
+import re
+from typing import Callable, List, Tuple, Union
+
+# tag names may contain spaces, and operators only if quoted
+TOKEN_RE = re.compile(
+    r"""\s*(?:([&|,!()])|"([^"]*)"|'([^']*)'|([^&|,!()\s"'][^&|,!()]*))"""
+)
+
+
+class TagQueryError(ValueError):
+    pass
+
+
+def tokenize(text: str) -> List[Union[str, Tuple]]:
+    """Return operators as strings and tag names as ("tag", name)."""
+    tokens: List[Union[str, Tuple]] = list()
+    pos = 0
+    text = text.rstrip()
+    while pos < len(text):
+        m = TOKEN_RE.match(text, pos)
+        if not m:
+            raise TagQueryError(f"Can't parse tag query at: {text[pos:]}")
+        operator, double_quoted, single_quoted, name = m.groups()
+        if operator:
+            tokens.append(operator)
+        elif name is not None:
+            tokens.append(("tag", name.strip()))
+        elif double_quoted is not None:
+            tokens.append(("tag", double_quoted))
+        else:
+            tokens.append(("tag", single_quoted))
+        pos = m.end()
+    return tokens
+
+
+def token_text(token) -> str:
+    return token[1] if isinstance(token, tuple) else token
+
+
+class Parser(object):
+    """Recursive descent parser for tag queries."""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.tokens = tokenize(text)
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def take(self):
+        token = self.peek()
+        if token is None:
+            raise TagQueryError(f"Unexpected end of tag query: {self.text}")
+        self.pos += 1
+        return token
+
+    def parse(self) -> Tuple:
+        node = self.parse_or()
+        if self.peek() is not None:
+            token = token_text(self.peek())
+            raise TagQueryError(f"Unexpected '{token}' in tag query: {self.text}")
+        return node
+
+    def parse_or(self) -> Tuple:
+        nodes = [self.parse_and()]
+        while self.peek() in ("|", ","):
+            self.take()
+            nodes.append(self.parse_and())
+        return nodes[0] if len(nodes) == 1 else ("or", nodes)
+
+    def parse_and(self) -> Tuple:
+        nodes = [self.parse_not()]
+        while self.peek() == "&":
+            self.take()
+            nodes.append(self.parse_not())
+        return nodes[0] if len(nodes) == 1 else ("and", nodes)
+
+    def parse_not(self) -> Tuple:
+        if self.peek() == "!":
+            self.take()
+            return ("not", self.parse_not())
+        return self.parse_atom()
+
+    def parse_atom(self) -> Tuple:
+        token = self.take()
+        if token == "(":
+            node = self.parse_or()
+            if self.take() != ")":
+                raise TagQueryError(f"Missing ')' in tag query: {self.text}")
+            return node
+        if isinstance(token, str):
+            raise TagQueryError(f"Unexpected '{token}' in tag query: {self.text}")
+        return token
+
+
+def parse(text: str) -> Tuple:
+    """Parse a tag query; raise TagQueryError if it is malformed."""
+    return Parser(text).parse()
+
+
+def as_query(tags: Union[str, List[str], Tuple]) -> Tuple:
+    """Return query for a query string, a list of tags or a parsed query."""
+    if isinstance(tags, str):
+        return parse(tags)
+    if isinstance(tags, tuple):
+        return tags
+    return ("or", [("tag", tag) for tag in tags])
+
+
+def evaluate(query: Tuple, bitmap: Callable[[str], int], universe: int) -> int:
+    """Evaluate query over bitmaps.
+
+    bitmap returns the bitmap of documents with a tag; universe has a
+    bit set for every document.
+
+    """
+    op, arg = query
+    if op == "tag":
+        return bitmap(arg)
+    if op == "not":
+        return universe & ~evaluate(arg, bitmap, universe)
+    if op == "and":
+        result = universe
+        for node in arg:
+            result &= evaluate(node, bitmap, universe)
+            if not result:
+                break
+        return result
+    result = 0
+    for node in arg:
+        result |= evaluate(node, bitmap, universe)
+    return result
+
+
+def to_sql(query: Tuple, uid_column="uid") -> Tuple[str, List[str]]:
+    """Translate query to an SQL condition on uid_column and its parameters."""
+    op, arg = query
+    if op == "tag":
+        sql = f"{uid_column} IN (SELECT uid FROM document_tag WHERE tag = ?)"
+        return sql, [arg]
+    if op == "not":
+        sql, params = to_sql(arg, uid_column)
+        return f"NOT ({sql})", params
+    parts = [to_sql(node, uid_column) for node in arg]
+    joiner = " AND " if op == "and" else " OR "
+    sql = joiner.join(f"({part})" for part, _ in parts)
+    return sql, [p for _, params in parts for p in params]
+
+
+def bit_positions(bits: int) -> List[int]:
+    """Return positions of the set bits, lowest first."""
+    s = bin(bits)[:1:-1]
+    positions = list()
+    i = s.find("1")
+    while i >= 0:
+        positions.append(i)
+        i = s.find("1", i + 1)
+    return positions
+
+
+def bitmap_from_positions(positions: List[int], size: int) -> int:
+    """Return int with the bits at positions set."""
+    buf = bytearray((size + 7) // 8)
+    for i in positions:
+        buf[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(buf, "little")
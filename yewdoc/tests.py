@@ -106,6 +106,417 @@ class TestYewdocsClient(unittest.TestCase):
     def test_create_document(self):
         self.create_document("test create document")
 
+    def test_get_short(self):
+        doc = self.create_document("test get short")
+        assert self.store.get_short(doc.short_uid()).uid == doc.uid
+        assert self.store.get_short("00000000") is None
+
+    def test_delete_document(self):
+        doc = self.create_document("test delete document")
+        self.store.delete_document(doc)
+        assert doc.uid not in self.store.doc_index
+        store = YewStore(username=self.username)
+        assert not store.get_docs(name_frag="test delete document")
+
+    def test_index_journal(self):
+        doc = self.create_document("test journal doc")
+        deleted = self.create_document("test journal deleted")
+        self.store.delete_document(deleted)
+        store = YewStore(username=self.username)
+        assert doc.uid in store.doc_index
+        assert deleted.uid not in store.doc_index
+        store.compact_index()
+        assert not os.path.exists(os.path.join(store.yew_dir, "index.journal"))
+        with open(os.path.join(store.yew_dir, "index.json")) as f:
+            assert [d["uid"] for d in json.load(f)] == [doc.uid]
+
+    def test_digest_cache(self):
+        doc = self.create_document("test digest doc", content="first")
+        digest = doc.digest
+        self.store.flush()
+        store = YewStore(username=self.username)
+        doc = store.get_doc(doc.uid)
+        with mock.patch.object(doc, "get_content", side_effect=AssertionError):
+            assert doc.digest == digest
+        doc.put_content("second version")
+        assert doc.digest != digest
+
+    def test_generate_doc_data(self):
+        doc = self.create_document("test generate index", content="some text")
+        doc.add_tag("mytag")
+        self.store.reindex_doc(doc)
+        with mock.patch("yewdoc.store.PARALLEL_MIN_DOCS", 0):
+            data = self.store.generate_doc_data(write=True, jobs=2)
+        assert len(data) == 1
+        for k in ["uid", "title", "kind", "digest", "tags", "size"]:
+            assert data[0][k] == doc.index_data[k]
+
+    def test_update_doc_data(self):
+        doc = self.create_document("test incremental", content="first")
+        other = self.create_document("test incremental other")
+        with open(doc.path, "wt") as f:
+            f.write("edited out of band")
+        shutil.rmtree(other.directory_path)
+        counts = self.store.update_doc_data()
+        assert counts["updated"] == 1
+        assert counts["removed"] == 1
+        assert self.store.get_doc(doc.uid).index_data["size"] == 18
+        assert self.store.update_doc_data()["updated"] == 0
+
+    def test_find_docs(self):
+        first = self.create_document("find first", content="Alpha beta gamma")
+        second = self.create_document("find second", content="alphabet soup")
+
+        def found(spec, **kwargs):
+            return {doc.uid for doc in self.store.find_docs(spec, **kwargs)}
+
+        assert found("beta") == {first.uid}
+        assert found("pha", string_only=True) == {first.uid, second.uid}
+        assert found("beta gamma") == {first.uid}
+        assert found("alpha") == {second.uid}
+        assert found("alpha", insensitive=True) == {first.uid, second.uid}
+        assert found("so.p") == {second.uid}
+        second.put_content("beta blocker")
+        assert found("beta") == {first.uid, second.uid}
+        self.store.flush()
+        assert os.path.exists(os.path.join(self.store.yew_dir, "word_index.json"))
+        # lower() would make the last sigma of ΟΣ a final one
+        greek = self.create_document("find greek", content="ΟΔΟΣΑ")
+        assert found("ΟΣ", string_only=True) == {greek.uid}
+        assert found("οσ", string_only=True, insensitive=True) == {greek.uid}
+
+    def test_word_index_version(self):
+        doc = self.create_document("word version", content="ΟΔΟΣ")
+        list(self.store.find_docs("ΟΔΟΣ"))
+        self.store.flush()
+        path = os.path.join(self.store.yew_dir, "word_index.json")
+        with open(path) as f:
+            data = json.load(f)
+        assert data["version"] == 2
+        # as version 1 wrote it
+        del data["version"]
+        data["terms"] = {"οδος": data["terms"]["οδοσ"]}
+        with open(path, "wt") as f:
+            json.dump(data, f)
+        store = YewStore(username=self.username)
+        assert [d.uid for d in store.find_docs("ΟΔΟΣ")] == [doc.uid]
+
+    def test_regex_candidates(self):
+        first = self.create_document("regex first", content="error: disk full")
+        second = self.create_document("regex second", content="warning: disk low")
+        candidates = self.store.search_candidates(r"err(or)?: \w+ full")
+        assert candidates == {first.uid}
+        assert self.store.search_candidates(r"\w+") is None
+        found = {doc.uid for doc in self.store.find_docs(r"(error|warning): disk")}
+        assert found == {first.uid, second.uid}
+
+    @mock.patch("yewdoc.search.SCAN_BATCH", 1)
+    def test_find_docs_parallel(self):
+        docs = [
+            self.create_document("scan plain", content="Mapped bytes"),
+            self.create_document("scan accents", content="Ünïcode text"),
+            self.create_document("scan other", content="nothing here"),
+        ]
+        found = {d.uid for d in self.store.find_docs("mapped", True, True, jobs=2)}
+        assert found == {docs[0].uid}
+        # needs the decoded text to ignore case
+        found = {d.uid for d in self.store.find_docs("ünï", True, True, jobs=2)}
+        assert found == {docs[1].uid}
+        found = {d.uid for d in self.store.find_docs(r"\w+code", jobs=2)}
+        assert found == {docs[1].uid}
+        # escapes and flags bytes patterns don't have
+        found = {d.uid for d in self.store.find_docs(r"\u00dcn", jobs=2)}
+        assert found == {docs[1].uid}
+        found = {d.uid for d in self.store.find_docs("(?u)bytes", jobs=2)}
+        assert found == {docs[0].uid}
+        # escapes that would mean bytes rather than characters
+        found = {d.uid for d in self.store.find_docs(r"\xdcn\xefcode", jobs=2)}
+        assert found == {docs[1].uid}
+        found = {d.uid for d in self.store.find_docs(r"[\xc0-\xff]n", jobs=2)}
+        assert found == {docs[1].uid}
+        # case folds that only text has
+        kelvin = self.create_document("scan kelvin", content="\u212aelvin")
+        found = {d.uid for d in self.store.find_docs("kelvin", True, True, jobs=2)}
+        assert found == {kelvin.uid}
+        found = {d.uid for d in self.store.find_docs("(?i)kelvin", jobs=2)}
+        assert found == {kelvin.uid}
+
+    def test_find_lines(self):
+        content = "one\nneedle two\nthree\nfour\nfive\nneedle six\nseven\nneedle\n"
+        self.create_document("find lines doc", content=content)
+        runner = CliRunner()
+        args = [f"--user={TEST_USERNAME}", "find", "needle", "-n", "-C", "1", "-m", "2"]
+        result = runner.invoke(cli, args)
+        assert result.exit_code == 0
+        assert result.output.splitlines() == [
+            "find lines doc-1-one",
+            "find lines doc:2:needle two",
+            "find lines doc-3-three",
+            "--",
+            "find lines doc-5-five",
+            "find lines doc:6:needle six",
+            "find lines doc-7-seven",
+        ]
+        result = runner.invoke(cli, args[:2] + ["needle", "-m", "0"])
+        assert result.exit_code == 0
+        assert result.output == ""
+        result = runner.invoke(cli, args[:2] + ["needle", "-C", "-1"])
+        assert result.exit_code == 2
+
+    def test_find(self):
+        self.create_document("test find doc", content="needle in a haystack")
+        runner = CliRunner()
+        result = runner.invoke(cli, [f"--user={TEST_USERNAME}", "find", "needle"])
+        assert result.exit_code == 0
+        assert "test find doc" in result.output
+
+    def test_tag_postings(self):
+        first = self.create_document("tag postings one")
+        second = self.create_document("tag postings two")
+        first.add_tag("red")
+        self.store.reindex_doc(first)
+        second.add_tag("red")
+        second.add_tag("blue")
+        self.store.reindex_doc(second)
+        assert self.store.get_tag_counts() == {"red": 2, "blue": 1}
+        assert [d.uid for d in self.store.get_docs(tags=["blue"])] == [second.uid]
+        self.store.delete_document(second)
+        assert self.store.get_tag_counts() == {"red": 1}
+        store = YewStore(username=self.username)
+        assert [d.uid for d in store.get_docs(tags=["red", "blue"])] == [first.uid]
+        assert store.get_tagged_count() == 1
+
+    def test_tag_query(self):
+        docs = dict()
+        for title, tags in [
+            ("q one", ["work", "r&d"]),
+            ("q two", ["work", "archived"]),
+        ]:
+            docs[title] = self.create_document(title)
+            for tag in tags:
+                docs[title].add_tag(tag)
+            self.store.reindex_doc(docs[title])
+        self.create_document("q three")
+
+        def titles(tags):
+            return sorted(d.name for d in self.store.get_docs(tags=tags))
+
+        assert titles("work & !archived") == ["q one"]
+        assert titles("!(work | archived)") == ["q three"]
+        assert titles("archived, nothing") == ["q two"]
+        assert titles(["work"]) == ["q one", "q two"]
+        # names with operators in them are quoted
+        assert titles('"r&d"') == ["q one"]
+        assert titles("'r&d' | archived") == ["q one", "q two"]
+        self.store.prefs.put_user_pref("index_engine", "sqlite")
+        self.store = YewStore(username=self.username)
+        assert titles("work & !archived") == ["q one"]
+        assert titles('!"r&d"') == ["q three", "q two"]
+        runner = CliRunner()
+        result = runner.invoke(cli, [f"--user={TEST_USERNAME}", "ls", "-t", "work &"])
+        assert result.exit_code == 2
+
+    def test_query_old_records(self):
+        for engine in ["json", "sqlite"]:
+            self.store.prefs.put_user_pref("index_engine", engine)
+            self.store = YewStore(username=self.username)
+            empty = self.create_document(f"old empty {engine}", content="")
+            self.create_document(f"old full {engine}")
+            # records from before sizes were indexed
+            for data in list(self.store.doc_index):
+                data.pop("size", None)
+                data.pop("mtime", None)
+                self.store.doc_index.put(data)
+            docs = self.store.get_docs(name_frag=engine, query="size=0")
+            assert [d.uid for d in docs] == [empty.uid]
+
+    def test_metadata_query(self):
+        big = self.create_document("meta big", content="x" * 2048)
+        big.add_tag("work")
+        self.store.reindex_doc(big)
+        self.create_document("meta small", content="x", kind="txt")
+
+        def titles(query):
+            return sorted(d.name for d in self.store.get_docs(query=query))
+
+        with mock.patch("os.stat", side_effect=AssertionError):
+            assert titles("size>1k") == ["meta big"]
+            assert titles("kind:md,rst updated<1h") == ["meta big"]
+            assert titles("updated>1h") == []
+            assert titles("encrypted:no link:no tag:'!work'") == ["meta small"]
+        self.store.prefs.put_user_pref("index_engine", "sqlite")
+        self.store = YewStore(username=self.username)
+        assert titles("size<=1k kind:txt title:small") == ["meta small"]
+        runner = CliRunner()
+        result = runner.invoke(cli, [f"--user={TEST_USERNAME}", "ls", "-q", "size~1"])
+        assert result.exit_code == 2
+
+    def test_columnar_index(self):
+        self.store.prefs.put_user_pref("index_engine", "columnar")
+        self.store = YewStore(username=self.username)
+        self.create_document("col empty", content="")
+        self.create_document("col big", content="x" * 100)
+        self.create_document("col small", content="x", kind="txt")
+
+        def titles(**kwargs):
+            return [d.name for d in self.store.get_docs(**kwargs)]
+
+        for numpy in [yewdoc.index.load_numpy(), None]:
+            with mock.patch("yewdoc.index.numpy", numpy):
+                self.store.doc_index.replace(self.store.index)
+                sizes = titles(order_by="size", descending=True)
+                assert sizes == ["col big", "col small", "col empty"]
+                assert titles(query="size=0") == ["col empty"]
+                assert titles(query="kind:md size>0", order_by="size") == ["col big"]
+                assert titles(name_frag="s", query="kind:txt") == ["col small"]
+                doc_index = self.store.doc_index
+                records = list(reversed(list(doc_index)))
+                sizes = [d["title"] for d in doc_index.sort_records(records, "size")]
+                assert sizes == ["col empty", "col small", "col big"]
+
+    def test_match_titles(self):
+        self.create_document("Project plan")
+        self.create_document("project (old)")
+        self.create_document("my project")
+
+        def titles(name_frag, exact=False):
+            docs = self.store.get_docs(name_frag=name_frag, exact=exact)
+            return [d.name for d in docs]
+
+        assert titles("PROJECT") == ["Project plan", "project (old)", "my project"]
+        assert titles("^proj") == ["Project plan", "project (old)"]
+        assert titles("project$") == ["my project"]
+        # exact titles are not regular expressions
+        assert titles("project (old)", exact=True) == ["project (old)"]
+        assert titles("project plan", exact=True) == []
+        doc = self.store.get_docs_by_title("my project")[0]
+        self.store.rename_doc(doc, "your project")
+        assert titles("^your") == ["your project"]
+        assert self.store.get_docs_by_title("my project") == []
+
+    def test_rank_docs(self):
+        self.create_document("project plan")
+        self.create_document("project planning notes")
+        self.create_document("shopping list")
+
+        def ranked(name, docs=None, limit=None):
+            return [d.name for d in self.store.rank_docs(name, docs, limit)]
+
+        # a typo still finds the document
+        assert ranked("projetc plan", limit=1) == ["project plan"]
+        assert ranked("project plan") == ["project plan", "project planning notes"]
+        assert ranked("shoping", limit=5)[0] == "shopping list"
+        # docs that share no trigram go last, in the order given
+        docs = self.store.get_docs()
+        assert ranked("planning", docs)[0] == "project planning notes"
+        assert len(ranked("planning", docs)) == 3
+
+    def test_document_menu(self):
+        from yewdoc.shared import document_menu
+
+        for i in range(45):
+            self.create_document(f"note {i}")
+        self.create_document("letter")
+        docs = self.store.get_docs()
+
+        def choose(answers, multiple=False):
+            with mock.patch("click.prompt", side_effect=answers):
+                with mock.patch("click.echo") as echo:
+                    chosen = document_menu(docs, multiple)
+            return [d.name for d in chosen], echo
+
+        # one page at a time
+        chosen, echo = choose(["", "", "45"])
+        assert chosen == ["letter"]
+        assert echo.call_count == 20 + 20 + 6 + 3
+        # typing narrows the list, numbers index the narrowed list
+        chosen, _ = choose(["note 4", "0-1"], multiple=True)
+        assert chosen == ["note 4", "note 40"]
+        chosen, _ = choose(["lett", "*", "0"])
+        assert chosen == ["note 0"]
+        chosen, _ = choose(["nothing like it", "q"])
+        assert chosen == []
+        # broken ranges are asked again
+        chosen, echo = choose(["-", "1-", "-3", "1--2", "1, 2"], multiple=True)
+        assert chosen == ["note 1", "note 2"]
+        echo.assert_any_call("Choice not in range")
+
+    def test_recent(self):
+        docs = [self.create_document(f"recent {i}") for i in range(4)]
+        self.store.prefs.put_user_pref("recent_list", json.dumps([docs[3].uid]))
+        self.store.prefs.put_user_pref("recent_size", "3")
+        store = YewStore(username=self.username)
+        # the old list in settings.json is carried over
+        assert [d.uid for d in store.get_recent()] == [docs[3].uid]
+        assert store.prefs.get_user_pref("recent_list") is None
+        for doc in docs[:3]:
+            store.update_recent(doc)
+        store.update_recent(docs[1])
+        assert [d.name for d in store.get_recent()] == [
+            "recent 1",
+            "recent 2",
+            "recent 0",
+        ]
+        store.delete_document(docs[2])
+        store = YewStore(username=self.username)
+        assert [d.name for d in store.get_recent()] == ["recent 1", "recent 0"]
+        # a batch writes the list once
+        with mock.patch(
+            "yewdoc.recent.write_json_atomic", wraps=yewdoc.recent.write_json_atomic
+        ) as write:
+            with store.batch():
+                store.delete_document(docs[0])
+                store.delete_document(docs[1])
+        write.assert_called_once()
+        store = YewStore(username=self.username)
+        assert store.get_recent() == []
+
+        runner = CliRunner()
+        args = [f"--user={TEST_USERNAME}", "show", "recent 3"]
+        assert runner.invoke(cli, args).exit_code == 0
+        # with no name, show offers the recent list
+        result = runner.invoke(cli, [f"--user={TEST_USERNAME}", "show"], input="0\n")
+        assert result.exit_code == 0
+        assert "0) recent 3" in result.output
+
+    def test_fuzzy_selection_asks(self):
+        self.create_document("shopping list")
+        runner = CliRunner()
+        args = [f"--user={TEST_USERNAME}", "path", "-l", "shoppinglsit"]
+        # a single suggestion is offered, not taken
+        result = runner.invoke(cli, args, input="q\n")
+        assert result.exit_code == 1
+        assert "0) shopping list" in result.output
+        result = runner.invoke(cli, args, input="0\n")
+        assert result.exit_code == 0
+        assert result.output.strip().endswith("shopping list.md")
+
+    def test_sqlite_index(self):
+        self.create_document("sqlite doc one", content="a")
+        self.store.prefs.put_user_pref("index_engine", "sqlite")
+        store = YewStore(username=self.username)
+        assert len(store.get_docs(name_frag="sqlite doc")) == 1
+        doc = store.create_document("sqlite doc two", "md", content="bbbb")
+        doc.add_tag("mytag")
+        store.reindex_doc(doc)
+        assert [d.uid for d in store.get_docs(tags=["mytag"])] == [doc.uid]
+        assert store.get_tag_counts() == {"mytag": 1}
+        assert store.get_short(doc.short_uid()).uid == doc.uid
+        docs = store.get_docs(order_by="size", descending=True)
+        assert docs[0].uid == doc.uid
+        result = CliRunner().invoke(
+            cli, [f"--user={TEST_USERNAME}", "generate-index", "--write"]
+        )
+        assert result.output.endswith("index.sqlite3\n")
+        # changing engine carries over changes made with the other one
+        store.prefs.put_user_pref("index_engine", "json")
+        store = YewStore(username=self.username)
+        assert [d.uid for d in store.get_docs(tags=["mytag"])] == [doc.uid]
+        store.create_document("sqlite doc three", "md")
+        store.prefs.put_user_pref("index_engine", "sqlite")
+        store = YewStore(username=self.username)
+        assert len(store.get_docs(name_frag="sqlite doc")) == 3
+
     def test_show_document(self):
         self.create_document("test show document")
         runner = CliRunner()
@@ -167,6 +578,18 @@ class TestYewdocsClient(unittest.TestCase):
         lines = result.output.split("\n")
         assert lines[0] == "first doc"
 
+    def test_ls_uses_index(self):
+        doc = self.create_document("test ls index", content="12345")
+        with open(doc.path, "wt") as f:
+            f.write("changed out of band")
+        runner = CliRunner()
+        result = runner.invoke(cli, [f"--user={TEST_USERNAME}", "ls", "-l"])
+        assert result.exit_code == 0
+        assert " 5 " in result.output
+        result = runner.invoke(cli, [f"--user={TEST_USERNAME}", "ls", "-l", "--verify"])
+        assert result.exit_code == 0
+        assert " 19 " in result.output
+
     def test_tail_document(self):
         self.create_document("test tail document", content="dummy")
         runner = CliRunner()
@@ -233,6 +656,166 @@ class TestYewdocsClient(unittest.TestCase):
         assert result.exit_code == 0
         # assert result.output == 'Hello Peter!\n'
 
+    def test_lazy_commands(self):
+        import subprocess
+        import sys
+
+        # importing the cli must not import the command modules
+        code = (
+            "import sys, yewdoc; print(sorted(m for m in sys.modules if '.cmd.' in m))"
+        )
+        out = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, check=True
+        )
+        assert out.stdout.strip() == "[]"
+        from yewdoc.shared import COMMAND_MODULES
+
+        cmd_path = os.path.join(os.path.dirname(yewdoc.__file__), "cmd")
+        modules = [n[:-3] for n in os.listdir(cmd_path) if n.endswith(".py")]
+        assert sorted(modules) == sorted(COMMAND_MODULES)
+        names = cli.list_commands(None)
+        assert "generate-index" in names and "ls" in names
+        assert cli.get_command(None, "user-pref").name == "user-pref"
+        assert cli.get_command(None, "no-such-command") is None
+
+    def test_remote_registry(self):
+        import subprocess
+        import sys
+        from yewdoc.remote import REMOTES, RemoteRegistry
+        from yewdoc.remote.s3remote import RemoteS3
+
+        code = "import sys, yewdoc.remote; print('s3fs' in sys.modules)"
+        out = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, check=True
+        )
+        assert out.stdout.strip() == "False"
+        assert REMOTES["RemoteS3"] is RemoteS3
+        assert list(REMOTES) == ["RemoteREST", "RemoteS3"]
+        point = mock.Mock()
+        point.name = "RemoteOther"
+        point.load.return_value = RemoteS3
+        with mock.patch("yewdoc.remote.entry_points", return_value={point.name: point}):
+            remotes = RemoteRegistry({})
+            assert "RemoteOther" in remotes
+            assert remotes["RemoteOther"] is RemoteS3
+            with self.assertRaises(KeyError):
+                remotes["RemoteNone"]
+
+    def test_profile(self):
+        import pstats
+
+        self.create_document("profiled doc")
+        runner = CliRunner()
+        result = runner.invoke(cli, [f"--user={TEST_USERNAME}", "--profile", "ls"])
+        assert result.exit_code == 0
+        assert "profiled doc" in result.output
+        phases = [line.split()[0] for line in result.output.splitlines()[1:-1]]
+        assert phases[0] == "import"
+        assert {
+            "store",
+            "prefs",
+            "index",
+            "remote",
+            "flush",
+            "command",
+            "total",
+        } <= set(phases)
+        path = os.path.join(fs.get_tmp_directory(TEST_USERNAME), "yd.pstats")
+        assert pstats.Stats(path).total_calls > 0
+
+    def test_daemon(self):
+        import io
+        import threading
+        import time
+        from yewdoc import daemon
+        from yewdoc.shared import YewCLI
+
+        self.create_document("daemon doc", content="needle")
+        server = daemon.Daemon(YewCLI(username=self.username))
+        path = daemon.socket_path(self.username)
+        thread = threading.Thread(target=server.serve, args=(path,))
+        thread.start()
+        for _ in range(100):
+            if os.path.exists(path):
+                break
+            time.sleep(0.01)
+        user = f"--user={TEST_USERNAME}"
+        try:
+            reply = daemon.request(path, {"args": [user, "ls"]})
+            assert reply["exit_code"] == 0
+            assert reply["output"] == "daemon doc\n"
+            # documents created by another process are seen
+            self.create_document("other doc")
+            with mock.patch("sys.stdout", new_callable=io.StringIO) as out:
+                assert daemon.run_in_daemon([user, "find", "needle"]) == 0
+            assert out.getvalue() == "daemon doc\n"
+            reply = daemon.request(path, {"args": [user, "ls"]})
+            assert reply["output"].splitlines() == ["daemon doc", "other doc"]
+            # commands that prompt or edit are left to the client
+            assert daemon.request(path, {"args": [user, "describe"]}) == {
+                "interactive": True
+            }
+            assert daemon.run_in_daemon([user, "edit", "daemon doc"]) is None
+            assert daemon.run_in_daemon(["--profile", "ls"]) is None
+            # a command that fails reports why
+            with mock.patch.object(
+                server.yew.store, "get_docs", side_effect=RuntimeError("boom")
+            ):
+                reply = daemon.request(path, {"args": [user, "ls"]})
+            assert reply["exit_code"] == 1
+            assert "Traceback" in reply["stderr"]
+            assert "RuntimeError: boom" in reply["stderr"]
+        finally:
+            daemon.request(path, {"stop": True})
+            thread.join(5)
+        assert not os.path.exists(path)
+        assert daemon.run_in_daemon([user, "ls"]) is None
+
+    def test_json_files(self):
+        from yewdoc import utils
+
+        path = os.path.join(self.store.yew_dir, "test.json")
+        assert utils.read_json(path, list(), "Ignoring damaged test") == []
+        utils.write_json_atomic(path, ["a", "b"])
+        assert not os.path.exists(f"{path}.tmp")
+        assert utils.read_json(path, list(), "Ignoring damaged test") == ["a", "b"]
+        with open(path, "wt") as f:
+            f.write('["a", ')
+        with mock.patch("builtins.print") as echo:
+            assert utils.read_json(path, None, "Ignoring damaged test") is None
+        echo.assert_called_once_with(f"Ignoring damaged test: {path}")
+
+    def test_batch(self):
+        from yewdoc import document, store
+
+        docs = [self.create_document(f"batch {i}") for i in range(3)]
+        tags_path = os.path.join(docs[0].directory_path, "__tags.json")
+        deleted_path = os.path.join(self.store.yew_dir, "deleted_index.json")
+        with mock.patch(
+            "yewdoc.store.append_index_journal", wraps=store.append_index_journal
+        ) as append_journal:
+            with self.store.batch():
+                for doc in docs:
+                    doc.add_tag("batched")
+                    doc.add_tag("twice")
+                    self.store.reindex_doc(doc)
+                with self.store.batch():
+                    self.store.delete_document(docs[2])
+                # nothing is written until the outer batch ends
+                assert sorted(docs[0].get_tag_index()) == ["batched", "twice"]
+                assert not os.path.exists(tags_path)
+                assert not os.path.exists(deleted_path)
+                append_journal.assert_not_called()
+            append_journal.assert_called_once()
+        tag_index = document.read_tag_index(docs[1].directory_path)
+        assert sorted(tag_index) == ["batched", "twice"]
+        assert self.store.get_deleted_index() == [docs[2].uid]
+        reopened = YewStore(username=self.username)
+        tagged = reopened.get_docs(tags="batched")
+        assert sorted(d.name for d in tagged) == ["batch 0", "batch 1"]
+        # the tag files written at the end don't look like changes
+        assert reopened.update_doc_data()["updated"] == 0
+
     def test_tag_document(self):
         self.create_document("test tag doc", content="dummy", kind="md")
         runner = CliRunner()
@@ -11,10 +11,6 @@ import traceback
 import uuid
 import tarfile
 
-import dateutil
-import dateutil.parser
-import humanize as h
-import markdown
 import pytz
 import tzlocal
 
@@ -95,6 +91,36 @@ def delete_directory(folder):
         print(e)
 
 
+def read_json(path, default, damaged):
+    """Return the json in the file at path, or default if there is none.
+
+    If the file can't be parsed, print damaged with the path and
+    return default.
+
+    """
+    if not os.path.exists(path):
+        return default
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except json.decoder.JSONDecodeError:
+        print(f"{damaged}: {path}")
+        return default
+
+
+def write_json_atomic(path, data, indent=None):
+    """Write data as json to path.
+
+    It is written to a temporary file first, so path is never left half
+    written.
+
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wt") as f:
+        f.write(json.dumps(data, indent=indent))
+    os.replace(tmp_path, path)
+
+
 def get_md5_digest(s, strip=False):
     if strip:
         s = s.rstrip()
@@ -121,6 +147,11 @@ def to_utc(dt):
     return local_tz.astimezone(pytz.utc)
 
 
+def utc_from_timestamp(t):
+    """Convert seconds since the epoch to utc datetime object."""
+    return datetime.datetime.fromtimestamp(t, pytz.utc)
+
+
 def modification_date(path):
     """Get modification date of path as UTC time."""
     t = os.path.getmtime(path)